@@ -0,0 +1,5 @@
+"""
+    Reproducible benchmarks for the point location and minimum enclosing triangle
+    code. Run `python -m benchmarks --help` from the repository root; results are
+    emitted as JSON so that runs can be compared.
+"""
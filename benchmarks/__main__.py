@@ -0,0 +1,53 @@
+"""Runs the benchmark suite and emits the results as JSON."""
+from __future__ import print_function
+
+import argparse
+import json
+import sys
+
+from benchmarks import suite
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[100, 1000, 10000, 100000, 1000000],
+                        help='input sizes to benchmark')
+    parser.add_argument('--queries', type=int, default=1000,
+                        help='single-point queries per size')
+    parser.add_argument('--batch-size', type=int, default=10000,
+                        help='points per locate_many call')
+    parser.add_argument('--batch-queries', type=int, default=100000,
+                        help='points located in batches per size')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', nargs='+', metavar='BENCHMARK',
+                        choices=['preprocessing', 'single_query', 'batch_query',
+                                 'min_triangle'],
+                        help='run a subset of the benchmarks')
+    parser.add_argument('--engines', nargs='+', metavar='ENGINE',
+                        choices=['kirkpatrick', 'trapezoid'],
+                        help='Locator engines to compare (default: kirkpatrick)')
+    parser.add_argument('--grid', type=int, metavar='RESOLUTION',
+                        help='index the kirkpatrick engine with a grid')
+    parser.add_argument('--output', '-o', help='write JSON here (default: stdout)')
+    args = parser.parse_args(argv)
+
+    def log(result):
+        print(json.dumps(result, sort_keys=True), file=sys.stderr)
+
+    report = suite.run(args.sizes, queries=args.queries, batch_size=args.batch_size,
+                       batch_queries=args.batch_queries, seed=args.seed,
+                       benchmarks=args.only, engines=args.engines,
+                       grid=args.grid, log=log)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        print()
+
+
+if __name__ == '__main__':
+    main()
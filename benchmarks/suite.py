@@ -0,0 +1,225 @@
+from __future__ import division
+
+import gc
+import platform
+import random
+import sys
+from math import cos, pi, sin
+from timeit import default_timer as timer
+
+import numpy as np
+
+from benchmarks import reference
+from geo.generator import randomPoint
+from geo.shapes import Point, Polygon
+from geo.spatial import triangulatePoints
+from kirkpatrick import Locator
+import min_triangle
+from stats import percentiles
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def seeded(seed):
+    """Seeds every source of randomness used by the generators."""
+    random.seed(seed)
+    return np.random.RandomState(seed)
+
+
+def peak_rss():
+    """Returns the peak resident set size of this process in bytes, if known."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def metadata(seed):
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'seed': seed,
+    }
+
+
+def randomTiling(n, seed):
+    """Returns a Delaunay triangulation of n random points in the unit square."""
+    seeded(seed)
+    return triangulatePoints([randomPoint() for i in range(n)])
+
+
+def randomQueries(locator, count, seed):
+    """Returns 'count' query points spread uniformly over the regions' bounding box."""
+    rng = seeded(seed)
+    xy = np.array([p.np() for region in locator.regions for p in region.points])
+    lo = xy.min(axis=0)
+    hi = xy.max(axis=0)
+    return lo + rng.random_sample((count, 2)) * (hi - lo)
+
+
+def preprocessing(n, seed, engine='kirkpatrick', grid=None):
+    """Times Locator construction over a random tiling of n points."""
+    tiling = randomTiling(n, seed)
+    gc.collect()
+    rss = peak_rss()
+    start = timer()
+    if engine == 'trapezoid':
+        locator = Locator(tiling, engine=engine)
+    else:
+        locator = Locator(tiling, engine=engine, grid=grid)
+    elapsed = timer() - start
+
+    result = {
+        'benchmark': 'preprocessing',
+        'engine': engine,
+        'n': n,
+        'regions': len(tiling),
+        'seconds': elapsed,
+        'hierarchy_bytes_per_region': hierarchyBytes(locator) / len(tiling),
+    }
+    result.update(locator.build_info())
+    if rss is not None:
+        # Only meaningful for the first (largest-so-far) build in a process
+        result['peak_rss_growth_per_region'] = (peak_rss() - rss) / len(tiling)
+    return locator, result
+
+
+def hierarchyBytes(locator):
+    structure = locator.structure
+    if locator.engine == 'trapezoid':
+        arrays = (structure.kinds, structure.keys, structure.first,
+                  structure.second, structure.leaves)
+    else:
+        arrays = (structure.vertices, structure.offsets, structure.children,
+                  structure.leaves)
+    return sum(a.nbytes for a in arrays)
+
+
+def singleQueries(locator, n, count, seed):
+    """Measures the latency of individual Locator.locate calls."""
+    xy = randomQueries(locator, count, seed)
+    points = [Point(x, y) for x, y in xy.tolist()]
+    samples = []
+    for p in points:
+        start = timer()
+        locator.locate(p)
+        samples.append(timer() - start)
+
+    result = {
+        'benchmark': 'single_query',
+        'engine': locator.engine,
+        'n': n,
+        'queries': count,
+    }
+    result['seconds'] = percentiles(samples)
+    return result
+
+
+def batchQueries(locator, n, count, batch_size, seed):
+    """Measures the latency of Locator.locate_many over fixed-size batches."""
+    xy = randomQueries(locator, count, seed)
+    samples = []
+    for i in range(0, count, batch_size):
+        batch = xy[i:i + batch_size]
+        start = timer()
+        locator.locate_many(batch)
+        samples.append(timer() - start)
+
+    result = {
+        'benchmark': 'batch_query',
+        'engine': locator.engine,
+        'n': n,
+        'queries': count,
+        'batch_size': batch_size,
+        'points_per_second': count / sum(samples),
+    }
+    result['seconds'] = percentiles(samples)
+    return result
+
+
+def randomConvexPolygon(n, seed):
+    """Returns a convex polygon with exactly n vertices, on a circle."""
+    rng = seeded(seed)
+    angles = np.sort(rng.random_sample(n) * 2 * pi)
+    return Polygon([Point(cos(a), sin(a)) for a in angles.tolist()])
+
+
+def timeTriangle(function, poly, repeat):
+    samples = []
+    for i in range(repeat):
+        start = timer()
+        triangle = function(poly)
+        samples.append(timer() - start)
+    return triangle, samples
+
+
+def minTriangle(n, seed, repeat=3, reference_limit=1000):
+    """
+        Times min_triangle.minTriangle over a convex polygon with n vertices,
+        against the original quadratic implementation in benchmarks.reference
+        for n up to 'reference_limit'.
+    """
+    poly = randomConvexPolygon(n, seed)
+    triangle, samples = timeTriangle(min_triangle.minTriangle, poly, repeat)
+
+    result = {'benchmark': 'min_triangle', 'n': n}
+    result['seconds'] = percentiles(samples)
+    if n <= reference_limit:
+        old, old_samples = timeTriangle(reference.minTriangle, poly, repeat)
+        result['reference_seconds'] = percentiles(old_samples)
+        result['speedup'] = float(np.median(old_samples) / np.median(samples))
+        result['area_ratio'] = triangle.area() / old.area()
+    return result
+
+
+def run(sizes, queries=1000, batch_size=10000, batch_queries=100000, seed=0,
+        benchmarks=None, engines=None, grid=None, log=None):
+    """
+        Runs the suite.
+
+        Arguments:
+        sizes -- the input sizes (number of points in the random tilings, or hull
+        vertices for min_triangle) to benchmark
+        queries -- the number of single-point queries per size
+        batch_size -- the number of points per locate_many call
+        batch_queries -- the total number of points located in batches per size
+        seed -- the seed for all random inputs
+        benchmarks -- the names of the benchmarks to run (default: all)
+        engines -- the Locator engines to compare (default: kirkpatrick only)
+        grid -- the resolution of the grid in front of the kirkpatrick engine
+        (default: none)
+        log -- a callable for progress messages
+
+        Returns: a JSON-serializable dict of results
+    """
+    names = benchmarks or ['preprocessing', 'single_query', 'batch_query',
+                           'min_triangle']
+    results = []
+
+    def record(result):
+        if log:
+            log(result)
+        results.append(result)
+
+    for n in sizes:
+        if set(names) & set(['preprocessing', 'single_query', 'batch_query']):
+            for engine in engines or ['kirkpatrick']:
+                locator, result = preprocessing(n, seed, engine, grid)
+                if 'preprocessing' in names:
+                    record(result)
+                if 'single_query' in names:
+                    record(singleQueries(locator, n, queries, seed))
+                if 'batch_query' in names:
+                    record(batchQueries(locator, n, batch_queries, batch_size,
+                                        seed))
+                del locator
+
+        if 'min_triangle' in names:
+            record(minTriangle(n, seed))
+
+    return {'meta': metadata(seed), 'results': results}
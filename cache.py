@@ -0,0 +1,89 @@
+import threading
+from collections import OrderedDict
+from math import floor
+
+# The default bound on the number of cached results
+MAX_ENTRIES = 1 << 16
+
+
+class ResultCache(object):
+
+    """
+        A bounded, least-recently-used cache of query results (the leaf each point
+        was located in), keyed on exact coordinates or on the cell of a square grid
+        of side 'quantum'. With a quantum, every point in a cell gets the result of
+        the first one located there, so it should be no larger than the precision
+        to which query points are snapped.
+
+        Results are only valid for the search structure they came from: the cache
+        empties itself when asked about another one (e.g. after a rebuild). It is
+        safe to share between threads.
+    """
+
+    def __init__(self, maxsize=MAX_ENTRIES, quantum=None):
+        """
+            Arguments:
+            maxsize -- the most results to keep, evicting the least recently used
+            quantum -- the side of the grid cells keys are snapped to (default:
+            exact coordinates)
+        """
+        self.maxsize = maxsize
+        self.quantum = quantum
+        self.lock = threading.Lock()
+        self.structure = None
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def key(self, x, y):
+        if self.quantum is None:
+            return x, y
+        return int(floor(x / self.quantum)), int(floor(y / self.quantum))
+
+    def switch(self, structure):
+        if structure is not self.structure:
+            self.entries.clear()
+            self.structure = structure
+
+    def get(self, structure, x, y):
+        """Returns the cached leaf for (x, y) in 'structure', or None."""
+        key = self.key(x, y)
+        with self.lock:
+            self.switch(structure)
+            leaf = self.entries.pop(key, None)
+            if leaf is None:
+                self.misses += 1
+                return None
+            # Re-insert as the most recently used
+            self.entries[key] = leaf
+            self.hits += 1
+            return leaf
+
+    def put(self, structure, x, y, leaf):
+        """Caches the leaf found for (x, y) in 'structure'."""
+        key = self.key(x, y)
+        with self.lock:
+            self.switch(structure)
+            self.entries.pop(key, None)
+            self.entries[key] = leaf
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        """Returns the number of hits and misses, and the current and maximum size."""
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self.entries),
+                'maxsize': self.maxsize,
+            }
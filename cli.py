@@ -0,0 +1,211 @@
+"""Builds point location indexes, and runs bulk queries against them."""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import re
+import sys
+from timeit import default_timer as timer
+
+from geo.shapes import Point, Polygon
+from kirkpatrick import Locator
+from stats import percentiles
+import stream
+
+WKT_GEOMETRY = re.compile(r'^\s*(MULTIPOLYGON|POLYGON)\s*(.*?)\s*$', re.IGNORECASE)
+WKT_COORDINATE = re.compile(r'([-+.\deE]+)\s+([-+.\deE]+)')
+
+
+def ring_to_polygon(ring):
+    """Converts a list of [x, y] positions (possibly closed) to a Polygon."""
+    points = [Point(float(p[0]), float(p[1])) for p in ring]
+    if len(points) > 1 and points[0] == points[-1]:
+        points.pop()
+    return Polygon(points)
+
+
+def polygons_of(rings_list):
+    """Converts a list of polygons, each given as a list of rings, to Polygons."""
+    polygons = []
+    for rings in rings_list:
+        if len(rings) > 1:
+            raise ValueError("Polygons with holes are not supported.")
+        polygons.append(ring_to_polygon(rings[0]))
+    return polygons
+
+
+def read_geojson(f):
+    """
+        Reads the Polygons and MultiPolygons of a GeoJSON geometry, feature, or
+        collection of either, in order.
+    """
+    def geometries(obj):
+        kind = obj.get('type')
+        if kind == 'FeatureCollection':
+            for feature in obj['features']:
+                for geometry in geometries(feature):
+                    yield geometry
+        elif kind == 'Feature':
+            if obj.get('geometry'):
+                for geometry in geometries(obj['geometry']):
+                    yield geometry
+        elif kind == 'GeometryCollection':
+            for child in obj['geometries']:
+                for geometry in geometries(child):
+                    yield geometry
+        else:
+            yield obj
+
+    regions = []
+    for geometry in geometries(json.load(f)):
+        if geometry['type'] == 'Polygon':
+            regions.extend(polygons_of([geometry['coordinates']]))
+        elif geometry['type'] == 'MultiPolygon':
+            regions.extend(polygons_of(geometry['coordinates']))
+        else:
+            raise ValueError("Unsupported geometry type: %s" % geometry['type'])
+    return regions
+
+
+def read_wkt(f):
+    """Reads one POLYGON or MULTIPOLYGON per line of well-known text, in order."""
+    regions = []
+    for line in f:
+        if not line.strip():
+            continue
+        match = WKT_GEOMETRY.match(line)
+        if not match:
+            raise ValueError("Unsupported WKT geometry: %s" % line.strip())
+        kind, body = match.groups()
+        if body.upper() == 'EMPTY':
+            continue
+        # Rewrite the nested coordinate lists as JSON arrays
+        body = WKT_COORDINATE.sub(r'[\1, \2]', body)
+        coordinates = json.loads(body.replace('(', '[').replace(')', ']'))
+        if kind.upper() == 'POLYGON':
+            coordinates = [coordinates]
+        regions.extend(polygons_of(coordinates))
+    return regions
+
+
+def read_regions(path, format=None):
+    """
+        Reads regions from a GeoJSON or WKT file (by default, WKT unless the
+        extension is .json or .geojson).
+    """
+    if format is None:
+        extension = os.path.splitext(path)[1].lower()
+        format = 'geojson' if extension in ('.json', '.geojson') else 'wkt'
+    with open(path, 'r') as f:
+        if format == 'geojson':
+            return read_geojson(f)
+        return read_wkt(f)
+
+
+def read_outline(path):
+    """Reads the single polygon of a GeoJSON or WKT file, by extension."""
+    polygons = read_regions(path)
+    if len(polygons) != 1:
+        raise ValueError("The outline must be a single polygon, not %d." % len(polygons))
+    return polygons[0]
+
+
+def build(args):
+    regions = read_regions(args.regions, args.format)
+    outline = read_outline(args.outline) if args.outline else None
+    start = timer()
+    locator = Locator(regions, outline=outline, max_degree=args.max_degree,
+                      strategy=args.strategy)
+    elapsed = timer() - start
+    locator.save(args.index)
+
+    report = {'regions': len(regions), 'seconds': elapsed,
+              'bytes': os.path.getsize(args.index)}
+    report.update(locator.build_info())
+    return report
+
+
+def query(args):
+    locator = Locator.load(args.index)
+    if args.grid:
+        locator.build_grid(args.grid)
+
+    samples = []
+    latencies = []
+    counts = {'points': 0, 'outside': 0}
+
+    def batches():
+        for xy in stream.read_points(args.points, args.batch_size, args.format):
+            # Time single queries on a sample of the first points
+            for x, y in xy[:args.sample - len(latencies)].tolist():
+                p = Point(x, y)
+                start = timer()
+                locator.locate(p)
+                latencies.append(timer() - start)
+
+            start = timer()
+            ids = locator.locate_many(xy)
+            samples.append(timer() - start)
+            counts['points'] += len(ids)
+            counts['outside'] += int((ids < 0).sum())
+            yield ids
+
+    if args.output:
+        stream.write_ids(batches(), args.output)
+    else:
+        for ids in batches():
+            pass
+
+    report = dict(counts)
+    report['batch_size'] = args.batch_size
+    if samples:
+        report['points_per_second'] = counts['points'] / sum(samples)
+        report['batch_seconds'] = percentiles(samples)
+    if latencies:
+        report['query_seconds'] = percentiles(latencies)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python cli.py', description=__doc__)
+    commands = parser.add_subparsers(dest='command')
+
+    parser_build = commands.add_parser(
+        'build', help='preprocess regions and save the index')
+    parser_build.add_argument('regions', help='a GeoJSON or WKT file of polygons')
+    parser_build.add_argument('index', help='where to save the index')
+    parser_build.add_argument('--format', choices=['geojson', 'wkt'],
+                              help='the regions format (default: by extension)')
+    parser_build.add_argument('--outline',
+                              help='a file holding the polygon the regions tile '
+                                   '(default: their convex hull)')
+    parser_build.add_argument('--max-degree', type=int, default=8)
+    parser_build.add_argument('--strategy', default='min-degree',
+                              choices=['min-degree', 'arbitrary'])
+    parser_build.set_defaults(run=build)
+
+    parser_query = commands.add_parser(
+        'query', help='locate a file of points against a saved index')
+    parser_query.add_argument('index', help='an index saved by build')
+    parser_query.add_argument('points', help='a CSV or raw float64 file of points')
+    parser_query.add_argument('--format', choices=['csv', 'binary'],
+                              help='the points format (default: by extension)')
+    parser_query.add_argument('--batch-size', type=int, default=100000)
+    parser_query.add_argument('--sample', type=int, default=1000,
+                              help='points to time as single queries')
+    parser_query.add_argument('--grid', type=int, metavar='RESOLUTION',
+                              help='index the hierarchy with a grid first')
+    parser_query.add_argument('--output', '-o',
+                              help='write region ids here (-1 for outside)')
+    parser_query.set_defaults(run=query)
+
+    args = parser.parse_args(argv)
+    report = args.run(args)
+    json.dump(report, sys.stdout, indent=2, sort_keys=True)
+    print()
+    return report
+
+
+if __name__ == '__main__':
+    main()
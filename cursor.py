@@ -0,0 +1,108 @@
+from geo.predicates import orient
+
+# The default number of triangles a cursor walks before falling back to a descent
+MAX_STEPS = 16
+
+
+class Cursor(object):
+
+    """
+        A stateful locator for spatially coherent query streams (e.g. traces of
+        moving points). It remembers the leaf triangle of its last answer and walks
+        from it across neighboring leaves (see Hierarchy.neighbors) towards each
+        new point, so that a point in the same triangle as the last takes a single
+        triangle test. If the walk leaves the triangulation or takes more than
+        max_steps steps, the query falls back to a full descent of the hierarchy.
+
+        A cursor follows its locator's current hierarchy (descending every time
+        while regions are patched, see Locator.replace_regions), and is not
+        thread-safe: use one cursor per stream.
+    """
+
+    def __init__(self, locator, max_steps=MAX_STEPS):
+        """
+            Arguments:
+            locator -- the Locator to query
+            max_steps -- the most steps a walk may take before falling back
+        """
+        self.locator = locator
+        self.max_steps = max_steps
+        self.structure = None
+        self.neighbors = None
+        self.leaf = -1
+        self.walks = 0
+        self.descents = 0
+
+    def walk(self, x, y):
+        """
+            Walks from the last leaf towards (x, y).
+
+            Returns: the leaf containing (x, y), or -1 if the walk gave up, and
+            the number of triangles tested
+        """
+        x, y = float(x), float(y)
+        vertices = self.structure.vertices
+        neighbors = self.neighbors
+        curr = self.leaf
+        for step in range(self.max_steps + 1):
+            if curr < 0:
+                return -1, step
+            ax, ay, bx, by, cx, cy = vertices[curr].tolist()
+            area = orient(ax, ay, bx, by, cx, cy)
+            d1 = orient(ax, ay, bx, by, x, y) * area
+            d2 = orient(bx, by, cx, cy, x, y) * area
+            d3 = orient(cx, cy, ax, ay, x, y) * area
+            # Cross the first edge with the point on its far side
+            if d1 < 0:
+                curr = neighbors[curr, 0]
+            elif d2 < 0:
+                curr = neighbors[curr, 1]
+            elif d3 < 0:
+                curr = neighbors[curr, 2]
+            elif area:
+                return curr, step + 1
+            else:
+                return -1, step + 1
+        return -1, self.max_steps + 1
+
+    def annotatedLocate(self, p, as_id=False):
+        """Locates the point p, with the same results as Locator.annotatedLocate."""
+        # Read each attribute once, as Locator.annotatedLocate does
+        locator = self.locator
+        structure = locator.structure
+        stats = locator.query_stats
+        if structure is not self.structure:
+            self.structure = structure
+            self.neighbors = getattr(structure, 'neighbors', None)
+            if self.neighbors is not None:
+                self.neighbors = self.neighbors()
+            self.leaf = -1
+        if self.neighbors is None:
+            # Patched structures have no leaf adjacency: descend every time
+            return locator.annotatedLocate(p, as_id)
+
+        # Triangles tested by the walk count as children tested, past the first
+        leaf, tested = self.walk(p.x, p.y)
+        if leaf >= 0:
+            self.walks += 1
+            levels, children = 0, tested - 1
+        else:
+            self.descents += 1
+            if stats is None:
+                leaf = structure.locate(p.x, p.y)
+            else:
+                leaf, levels, children = structure.trace(p.x, p.y)
+                children += tested
+        if stats is not None:
+            stats.record(levels, children)
+
+        if leaf >= 0:
+            self.leaf = leaf
+        return locator.resolve(structure, leaf, as_id)
+
+    def locate(self, p, as_id=False):
+        """Locates the point p, with the same results as Locator.locate."""
+        region, valid = self.annotatedLocate(p, as_id)
+        if not valid:
+            return -1 if as_id else None
+        return region
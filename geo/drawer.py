@@ -19,7 +19,7 @@ def plot(polygons, style='g-'):
     if not type(polygons) == list:
         polygons = [polygons]
     for polygon in polygons:
-        points = polygon.points + [polygon.points[0]]
+        points = list(polygon.points) + [polygon.points[0]]
         plotPoints(points, style=style)
 
 
@@ -0,0 +1,75 @@
+from fractions import Fraction
+
+import numpy as np
+
+# Shewchuk's static bound on the relative error of the floating-point
+# orientation determinant, (3 + 16 eps) eps for double precision
+EPSILON = 2.0 ** -53
+ERROR_BOUND = (3.0 + 16.0 * EPSILON) * EPSILON
+
+
+def orientExact(ax, ay, bx, by, cx, cy):
+    """Returns the sign of the orientation of abc, computed in exact arithmetic."""
+    ax, ay, bx, by, cx, cy = [Fraction(float(v)) for v in (ax, ay, bx, by, cx, cy)]
+    det = (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+    return (det > 0) - (det < 0)
+
+
+def orient(ax, ay, bx, by, cx, cy):
+    """
+        Returns the sign of the orientation of abc: 1 if c lies left of ab (abc
+        is counter-clockwise), -1 if it lies right, and 0 if they are collinear.
+
+        The determinant is evaluated in floating point, and only recomputed
+        exactly when it is smaller than its error bound. Coordinates must be
+        Python floats (or float64s).
+    """
+    left = (bx - ax) * (cy - ay)
+    right = (by - ay) * (cx - ax)
+    det = left - right
+
+    # The sign is exact unless both products have the same sign
+    if left > 0:
+        if right <= 0:
+            return 1
+        total = left + right
+    elif left < 0:
+        if right >= 0:
+            return -1
+        total = -left - right
+    else:
+        return (right < 0) - (right > 0)
+
+    bound = ERROR_BOUND * total
+    if det >= bound:
+        return 1
+    if -det >= bound:
+        return -1
+    return orientExact(ax, ay, bx, by, cx, cy)
+
+
+def orientMany(ax, ay, bx, by, cx, cy):
+    """
+        Vectorized orient over float64 arrays (or scalars) broadcast against one
+        another. Entries whose determinant is within its error bound are
+        recomputed exactly, one at a time.
+
+        Returns: an array of determinants whose signs are exact (ambiguous
+        entries are replaced by their exact sign)
+    """
+    ax, ay, bx, by, cx, cy = [np.asarray(v, dtype=np.float64)
+                              for v in (ax, ay, bx, by, cx, cy)]
+    # Kept as arrays (0-d for scalars) so that they can be updated in place
+    left = np.asarray((bx - ax) * (cy - ay))
+    right = np.asarray((by - ay) * (cx - ax))
+    det = np.asarray(left - right)
+
+    bound = np.abs(left, out=left)
+    bound += np.abs(right, out=right)
+    bound *= ERROR_BOUND
+    ambiguous = np.abs(det) < bound
+    if ambiguous.any():
+        args = np.broadcast_arrays(ax, ay, bx, by, cx, cy)
+        rows = zip(*[a[ambiguous].tolist() for a in args])
+        det[ambiguous] = [orientExact(*row) for row in rows]
+    return det
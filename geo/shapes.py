@@ -1,12 +1,19 @@
 from random import random
 from math import sqrt
+import predicates
 import spatial
 from drawer import *
 
 
+def orientation(A, B, C):
+    """Returns 1 if A, B, and C turn ccw, -1 if they turn cw, and 0 if collinear (exactly)"""
+    return predicates.orient(float(A.x), float(A.y), float(B.x), float(B.y),
+                             float(C.x), float(C.y))
+
+
 def ccw(A, B, C):
     """Tests whether the line formed by A, B, and C is ccw"""
-    return (B.x - A.x) * (C.y - A.y) > (B.y - A.y) * (C.x - A.x)
+    return orientation(A, B, C) > 0
 
 
 def intersect(a1, b1, a2, b2):
@@ -17,9 +24,23 @@ def intersect(a1, b1, a2, b2):
 
 class Point(object):
 
+    """An immutable point; its hash is computed once, at construction."""
+
+    __slots__ = ('x', 'y', '_hash')
+
     def __init__(self, x, y):
-        self.x = x
-        self.y = y
+        object.__setattr__(self, 'x', x)
+        object.__setattr__(self, 'y', y)
+        object.__setattr__(self, '_hash', hash((x, y)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Point is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Point is immutable")
+
+    def __reduce__(self):
+        return (Point, (self.x, self.y))
 
     def __str__(self):
         return "(" + str(self.x) + ", " + str(self.y) + ")"
@@ -28,7 +49,7 @@ class Point(object):
         return self.x == other.x and self.y == other.y
 
     def __hash__(self):
-        return hash((self.x, self.y))
+        return self._hash
 
     def __add__(self, other):
         return Point(self.x + other.x, self.y + other.y)
@@ -54,6 +75,8 @@ class Point(object):
 
 class Line(object):
 
+    __slots__ = ('p1', 'p2', 'slope', 'intercept', 'vertical')
+
     def __init__(self, p1, p2):
         self.p1 = p1
         self.p2 = p2
@@ -119,12 +142,21 @@ class Line(object):
 
 class Polygon(object):
 
+    __slots__ = ('points', 'n', '_hash', '_convex', '_triangles', '_bbox')
+
     def __init__(self, points):
         if len(points) < 3:
             raise ValueError("Polygon must have at least three vertices.")
 
-        self.points = points
+        # A tuple, so that the vertices cannot change under the derived data
+        self.points = tuple(points)
         self.n = len(points)
+        self._hash = hash(tuple(sorted(points, key=lambda p: p.x)))
+
+        # Derived data, computed lazily
+        self._convex = None
+        self._triangles = None
+        self._bbox = None
 
     def __str__(self):
         s = ""
@@ -135,37 +167,39 @@ class Polygon(object):
         return s
 
     def __hash__(self):
-        return hash(tuple(sorted(self.points, key=lambda p: p.x)))
+        return self._hash
 
     def contains(self, p):
         """Returns True if p is inside self."""
+        min_x, min_y, max_x, max_y = self.bbox()
+        if p.x < min_x or p.x > max_x or p.y < min_y or p.y > max_y:
+            return False
+
         if self.isConvex():
-            # If convex, use CCW-esque algorithm
-            inside = False
-
-            p1 = self.points[0]
-            for i in range(self.n + 1):
-                p2 = self.points[i % self.n]
-                if p.y > min(p1.y, p2.y):
-                    if p.y <= max(p1.y, p2.y):
-                        if p.x <= max(p1.x, p2.x):
-                            if p1.y != p2.y:
-                                xints = (p.y - p1.y) * \
-                                    (p2.x - p1.x) / (p2.y - p1.y) + p1.x
-                            if p1.x == p2.x or p.x <= xints:
-                                inside = not inside
+            # If convex, p is inside unless it lies strictly left of one edge and
+            # strictly right of another (points on an edge count as inside)
+            sides = set([0])
+            p1 = self.points[-1]
+            for p2 in self.points:
+                sides.add(orientation(p1, p2, p))
+                if len(sides) == 3:
+                    return False
                 p1 = p2
 
-            return inside
+            return True
         else:
-            # If concave, must triangulate and check individual triangles
-            triangles = spatial.triangulatePolygon(self)
-            for triangle in triangles:
+            # If concave, must check the individual triangles
+            for triangle in self.triangulation():
                 if triangle.contains(p):
                     return True
             return False
 
     def isConvex(self):
+        if self._convex is None:
+            self._convex = self._isConvex()
+        return self._convex
+
+    def _isConvex(self):
         target = None
         for i in range(self.n):
             # Check every triplet of points
@@ -173,14 +207,31 @@ class Polygon(object):
             B = self.points[(i + 1) % self.n]
             C = self.points[(i + 2) % self.n]
 
-            if not target:
-                target = ccw(A, B, C)
-            else:
-                if ccw(A, B, C) != target:
-                    return False
+            # Collinear triplets turn neither way
+            turn = orientation(A, B, C)
+            if not turn:
+                continue
+            if target is None:
+                target = turn
+            elif turn != target:
+                return False
 
         return True
 
+    def triangulation(self):
+        """Returns a triangulation of the polygon, computed once."""
+        if self._triangles is None:
+            self._triangles = list(spatial.triangulatePolygon(self))
+        return self._triangles
+
+    def bbox(self):
+        """Returns the bounding box (min_x, min_y, max_x, max_y), computed once."""
+        if self._bbox is None:
+            xs = [p.x for p in self.points]
+            ys = [p.y for p in self.points]
+            self._bbox = (min(xs), min(ys), max(xs), max(ys))
+        return self._bbox
+
     def ccw(self):
         """Returns True if the points are provided in CCW order."""
         return ccw(self.points[0], self.points[1], self.points[2])
@@ -228,7 +279,7 @@ class Polygon(object):
                     p = self.smartInteriorPoint()
 
             if INTERIOR:
-                return Polygon(p1 + [p]), Polygon(p2 + [p])
+                return Polygon(p1 + (p,)), Polygon(p2 + (p,))
             else:
                 return Polygon(p1), Polygon(p2)
 
@@ -266,16 +317,13 @@ class Polygon(object):
 
     def area(self):
         """Returns the area of the polygon."""
-        triangles = spatial.triangulatePolygon(self)
+        triangles = self.triangulation()
         areas = [t.area() for t in triangles]
         return sum(areas)
 
     def interiorPoint(self):
         """Returns a random point interior point via rejection sampling."""
-        min_x = min([p.x for p in self.points])
-        max_x = max([p.x for p in self.points])
-        min_y = min([p.y for p in self.points])
-        max_y = max([p.y for p in self.points])
+        min_x, min_y, max_x, max_y = self.bbox()
 
         def x():
             return min_x + random() * (max_x - min_x)
@@ -291,10 +339,7 @@ class Polygon(object):
 
     def exteriorPoint(self):
         """Returns a random exterior point near the polygon."""
-        min_x = min([p.x for p in self.points])
-        max_x = max([p.x for p in self.points])
-        min_y = min([p.y for p in self.points])
-        max_y = max([p.y for p in self.points])
+        min_x, min_y, max_x, max_y = self.bbox()
 
         def off():
             return 1 - 2 * random()
@@ -313,7 +358,7 @@ class Polygon(object):
 
     def smartInteriorPoint(self):
         """Returns a random interior point via triangulation."""
-        triangles = spatial.triangulatePolygon(self)
+        triangles = self.triangulation()
         areas = [t.area() for t in triangles]
         total = sum(areas)
         probabilities = [area / total for area in areas]
@@ -329,9 +374,19 @@ class Polygon(object):
 
 class Triangle(Polygon):
 
+    __slots__ = ()
+
     def __init__(self, A, B, C):
-        self.points = [A, B, C]
+        self.points = (A, B, C)
         self.n = 3
+        self._hash = hash(tuple(sorted(self.points, key=lambda p: p.x)))
+
+        self._convex = True
+        self._triangles = None
+        self._bbox = None
+
+    def triangulation(self):
+        return [self]
 
     def area(self):
         A = self.points[0]
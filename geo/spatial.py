@@ -9,29 +9,47 @@ def toNumpy(points):
     return np.array(map(lambda p: p.np(), points), np.float32)
 
 
+def toArray(xy):
+    """Returns 'xy' (any (N, 2) array-like or buffer) as an (N, 2) float64 array."""
+    return np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+
+
+def area(poly):
+    """Returns the area of poly, computed in double precision (shoelace formula)."""
+    xy = np.array([(p.x, p.y) for p in poly.points], dtype=np.float64)
+    x, y = xy[:, 0], xy[:, 1]
+    return abs(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1))) / 2.0
+
+
 def triangulatePolygon(poly, hole=None):
     # Triangulate poly with hole
-    cdt = CDT(poly.points)
+    # poly2tri takes lists
+    cdt = CDT(list(poly.points))
     if hole:
-        cdt.add_hole(hole)
+        cdt.add_hole(list(hole))
     triangles = cdt.triangulate()
 
-    # Frustratingly, CDT sometimes returns points that are not
-    # EXACTLY the same as the input points, so we use a KDTree
-    valid_points = [shapes.Point(p.x, p.y) for p in poly.points]
+    # Frustratingly, CDT sometimes returns points that are not EXACTLY the
+    # same as the input points, so corners are matched to the input by exact
+    # coordinates first, with one nearest-neighbour query for any stragglers
+    valid_points = list(poly.points)
     if hole:
-        valid_points += [shapes.Point(p.x, p.y) for p in hole]
-    tree = sp.KDTree(toNumpy(valid_points))
-
-    def convert(t):
-        def findClosest(point):
-            idx = tree.query(toNumpy([point]))[1]
-            return valid_points[idx]
-        A = findClosest(shapes.Point(t.a.x, t.a.y))
-        B = findClosest(shapes.Point(t.b.x, t.b.y))
-        C = findClosest(shapes.Point(t.c.x, t.c.y))
-        return shapes.Triangle(A, B, C)
-    return map(convert, triangles)
+        valid_points += hole
+    exact = {}
+    for p in valid_points:
+        exact[(p.x, p.y)] = p
+
+    corners = [(v.x, v.y) for t in triangles for v in (t.a, t.b, t.c)]
+    snapped = [exact.get(c) for c in corners]
+    missing = [i for i, p in enumerate(snapped) if p is None]
+    if missing:
+        tree = sp.cKDTree([(p.x, p.y) for p in valid_points])
+        _, closest = tree.query([corners[i] for i in missing])
+        for i, j in zip(missing, closest):
+            snapped[i] = valid_points[j]
+
+    return [shapes.Triangle(snapped[i], snapped[i + 1], snapped[i + 2])
+            for i in range(0, len(snapped), 3)]
 
 
 def triangulatePoints(points):
@@ -1,3 +1,22 @@
+def arbitrary_order(g, candidates, key=None):
+    """Visits candidates in (hash-dependent) set order."""
+    return list(candidates)
+
+
+def min_degree_order(g, candidates, key=None):
+    """Visits candidates by increasing degree, breaking ties by key (if given)."""
+    if key is None:
+        return sorted(candidates, key=lambda v: len(g.e[v]))
+    return sorted(candidates, key=lambda v: (len(g.e[v]), key(v)))
+
+
+# Orders in which independent_set may visit its candidates
+STRATEGIES = {
+    'arbitrary': arbitrary_order,
+    'min-degree': min_degree_order,
+}
+
+
 class DirectedGraph(object):
 
     def __init__(self):
@@ -52,9 +71,8 @@ class DirectedGraph(object):
         return self.e[v]
 
     def root(self):
-        root = self.roots.pop()
-        self.roots.add(root)
-        return root
+        # Peek without popping, so that lookups never mutate the graph
+        return next(iter(self.roots))
 
 
 class UndirectedGraph(DirectedGraph):
@@ -63,8 +81,27 @@ class UndirectedGraph(DirectedGraph):
         self.e[u].add(v)
         self.e[v].add(u)
 
-    def independent_set(self, k, avoid=None):
-        """Returns independent set of nodes with degree <= k"""
+    def remove_node(self, v):
+        """Removes v along with its edges."""
+        for u in self.e.pop(v):
+            self.e[u].discard(v)
+        self.roots.discard(v)
+
+    def independent_set(self, k, avoid=None, strategy='arbitrary', key=None):
+        """
+            Returns independent set of nodes with degree <= k, built greedily.
+
+            Arguments:
+            k -- the maximum degree of a node in the set
+            avoid -- nodes to leave out of the set
+            strategy -- the order in which to consider nodes: a name in STRATEGIES,
+            or a function (graph, candidates, key) returning the ordered candidates
+            key -- a function mapping nodes to sortable values, used by the
+            deterministic strategies to break ties
+        """
+        if not callable(strategy):
+            strategy = STRATEGIES[strategy]
+
         # Mark nodes w/ degree > k
         candidates = set([])
         for v in self.e:
@@ -75,13 +112,16 @@ class UndirectedGraph(DirectedGraph):
             candidates.difference_update(avoid)
 
         vertices = set([])
+        excluded = set([])
+
+        for v in strategy(self, candidates, key):
+            if v in excluded:
+                continue
 
-        while len(candidates):
             # Add new vertex to independent set
-            v = candidates.pop()
             vertices.add(v)
 
-            # Remove neighboring vertices
-            candidates.difference_update(self.e[v])
+            # Exclude neighboring vertices
+            excluded.update(self.e[v])
 
         return vertices
@@ -0,0 +1,155 @@
+from math import ceil, sqrt
+
+import numpy as np
+
+from hierarchy import contains_rows
+
+# The default bound on the number of cells (8 bytes each)
+MAX_CELLS = 1 << 20
+
+
+def uniform_regions(hierarchy):
+    """
+        Returns, for each node of a hierarchy, the index of the region covering
+        all of its triangle: a region index, -1 if it is entirely outside every
+        region, or -2 if it overlaps several.
+    """
+    offsets = hierarchy.offsets
+    degree = np.diff(offsets)
+    inner = np.flatnonzero(degree)
+    # Every internal node has children, so no segment below is empty
+    starts = offsets[inner]
+
+    unknown = -3
+    uniform = np.where(degree == 0, hierarchy.leaves, unknown)
+    pending = inner
+    while len(pending):
+        values = uniform[hierarchy.children]
+        low = np.minimum.reduceat(values, starts)
+        high = np.maximum.reduceat(values, starts)
+        resolved = low != unknown
+        uniform[inner[resolved]] = np.where(low == high, low, -2)[resolved]
+        pending = inner[~resolved]
+    return uniform
+
+
+class Grid(object):
+
+    """
+        A uniform grid over a hierarchy's regions, giving each cell a node to
+        start its queries from: the deepest node whose triangle contains the
+        whole cell, or, if that node lies within a single region, one of the
+        region's leaves, which answers queries in the cell without any test.
+        Cells that the root does not contain (and points outside the grid) start
+        from the root.
+    """
+
+    def __init__(self, hierarchy, resolution, max_cells=MAX_CELLS):
+        """
+            Arguments:
+            hierarchy -- the Hierarchy to index
+            resolution -- the number of cells along the longer side of the regions'
+            bounding box
+            max_cells -- the most cells to use, lowering the resolution if needed
+        """
+        offsets = hierarchy.offsets
+        children = hierarchy.children
+        vertices = hierarchy.vertices
+
+        interior = vertices[hierarchy.leaves >= 0].reshape(-1, 2)
+        lo = interior.min(axis=0)
+        extent = np.maximum(interior.max(axis=0) - lo, 1e-12)
+        size = extent.max() / max(resolution, 1)
+        while True:
+            nx, ny = [max(int(ceil(e / size)), 1) for e in extent.tolist()]
+            if nx * ny <= max_cells:
+                break
+            size *= sqrt(float(nx * ny) / max_cells) * 1.001
+        self.resolution = resolution
+        self.max_cells = max_cells
+        self.origin = (float(lo[0]), float(lo[1]))
+        self.size = float(size)
+        self.shape = (nx, ny)
+
+        # Cell corners, padded so that points rounded into a cell stay inside
+        pad = 1e-6 * size
+        ix, iy = np.meshgrid(np.arange(nx), np.arange(ny))
+        x0 = lo[0] + ix.ravel() * size - pad
+        y0 = lo[1] + iy.ravel() * size - pad
+        x1 = x0 + size + 2 * pad
+        y1 = y0 + size + 2 * pad
+        corners = [np.column_stack(c) for c in ((x0, y0), (x1, y0), (x1, y1), (x0, y1))]
+
+        def contains_cells(nodes, cells):
+            inside = np.ones(len(cells), dtype=bool)
+            for c in corners:
+                inside &= contains_rows(vertices[nodes], c[cells])
+            return inside
+
+        # Descend while a child contains the whole cell
+        start = np.zeros(nx * ny, dtype=np.int64)
+        active = np.flatnonzero(contains_cells(start, np.arange(nx * ny)))
+        while len(active):
+            node = start[active]
+            first = offsets[node]
+            degree = offsets[node + 1] - first
+            found = np.empty(len(active), dtype=np.int64)
+            found.fill(-1)
+            k = 0
+            while True:
+                pending = np.flatnonzero((found < 0) & (degree > k))
+                if not len(pending):
+                    break
+                child = children[first[pending] + k]
+                hit = contains_cells(child, active[pending])
+                found[pending[hit]] = child[hit]
+                k += 1
+            keep = found >= 0
+            active = active[keep]
+            start[active] = found[keep]
+
+        # Cells within a single leaf start from it, even if the levels above cut
+        # across them
+        inner = np.flatnonzero(offsets[start + 1] > offsets[start])
+        if len(inner):
+            leaf = hierarchy.locate_many(corners[0][inner])
+            keep = leaf >= 0
+            inner, leaf = inner[keep], leaf[keep]
+            keep = contains_cells(leaf, inner)
+            start[inner[keep]] = leaf[keep]
+
+        # Cells within a single region jump straight to one of its leaves
+        uniform = uniform_regions(hierarchy)
+        covered = np.flatnonzero(uniform[start] >= 0)
+        node = start[covered]
+        while len(node):
+            inner = offsets[node + 1] > offsets[node]
+            start[covered[~inner]] = node[~inner]
+            covered = covered[inner]
+            node = children[offsets[node[inner]]]
+
+        start.setflags(write=False)
+        self.start = start
+
+    def __len__(self):
+        return len(self.start)
+
+    def lookup(self, x, y):
+        """Returns the node to start locating (x, y) from."""
+        fx = (x - self.origin[0]) / self.size
+        fy = (y - self.origin[1]) / self.size
+        nx, ny = self.shape
+        if 0 <= fx < nx and 0 <= fy < ny:
+            return int(self.start[int(fy) * nx + int(fx)])
+        return 0
+
+    def lookup_many(self, xy):
+        """Returns the node to start locating each point of an (N, 2) array from."""
+        fx = (xy[:, 0] - self.origin[0]) / self.size
+        fy = (xy[:, 1] - self.origin[1]) / self.size
+        nx, ny = self.shape
+        inside = (fx >= 0) & (fx < nx) & (fy >= 0) & (fy < ny)
+        start = np.zeros(len(xy), dtype=np.int64)
+        cells = fy[inside].astype(np.int64) * nx + fx[inside].astype(np.int64)
+        start[inside] = self.start[cells]
+        return start
@@ -0,0 +1,467 @@
+import mmap
+import os
+import struct
+import tempfile
+import uuid
+
+import numpy as np
+
+from geo import shapes, spatial
+from geo.predicates import ERROR_BOUND, orient, orientMany
+
+# Saved hierarchies start with a fixed-size header, followed by flat
+# little-endian arrays (see layout)
+MAGIC = b'KPLOCATE'
+VERSION = 1
+HEADER = '<8sIIqqqq'
+HEADER_SIZE = 64
+
+# Published hierarchies live in RAM-backed shared memory where available
+SHARED_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+
+def contains_rows(triangles, xy):
+    """
+        Tests each point of 'xy' against the triangle on the same row of 'triangles'
+        (an array of [ax, ay, bx, by, cx, cy] rows). Points on an edge count as inside,
+        with exact orientation tests (see geo.predicates).
+    """
+    x = xy[:, 0]
+    y = xy[:, 1]
+    ax, ay, bx, by, cx, cy = [triangles[:, i] for i in range(6)]
+    d1 = orientMany(ax, ay, bx, by, x, y)
+    d2 = orientMany(bx, by, cx, cy, x, y)
+    d3 = orientMany(cx, cy, ax, ay, x, y)
+    return (((d1 >= 0) & (d2 >= 0) & (d3 >= 0))
+            | ((d1 <= 0) & (d2 <= 0) & (d3 <= 0)))
+
+
+def layout(m, e, r, p):
+    """
+        Describes the arrays of a saved hierarchy with m nodes, e child links, and
+        r regions of p vertices in total.
+
+        Returns: a list of (name, dtype, shape, byte offset), and the total size
+    """
+    arrays = [
+        ('vertices', '<f8', (m, 6)),
+        ('offsets', '<i8', (m + 1,)),
+        ('children', '<i8', (e,)),
+        ('leaves', '<i8', (m,)),
+        ('region_offsets', '<i8', (r + 1,)),
+        ('region_points', '<f8', (p, 2)),
+    ]
+    offset = HEADER_SIZE
+    result = []
+    for name, dtype, shape in arrays:
+        result.append((name, dtype, shape, offset))
+        offset += int(np.prod(shape)) * np.dtype(dtype).itemsize
+    return result, offset
+
+
+class Regions(object):
+
+    """
+        A read-only sequence of polygons stored as flat coordinate arrays: the
+        vertices of region i are points[offsets[i]:offsets[i + 1]]. Polygons are
+        only built (once) when accessed. Empty slots (None, left by
+        Locator.replace_regions) are stored as empty ranges.
+    """
+
+    def __init__(self, offsets, points):
+        offsets.setflags(write=False)
+        points.setflags(write=False)
+        self.offsets = offsets
+        self.points = points
+        self._polygons = {}
+
+    @classmethod
+    def from_polygons(cls, polygons):
+        if isinstance(polygons, cls):
+            return polygons
+        offsets = np.zeros(len(polygons) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([polygon.n if polygon is not None else 0
+                                 for polygon in polygons])
+        points = np.array([p.np() for polygon in polygons if polygon is not None
+                           for p in polygon.points], dtype=np.float64).reshape(-1, 2)
+        return cls(offsets, points)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("region index out of range")
+
+        polygon = self._polygons.get(i)
+        if polygon is None:
+            if self.offsets[i] == self.offsets[i + 1]:
+                return None
+            coords = self.points[self.offsets[i]:self.offsets[i + 1]].tolist()
+            points = [shapes.Point(x, y) for x, y in coords]
+            if len(points) == 3:
+                polygon = shapes.Triangle(points[0], points[1], points[2])
+            else:
+                polygon = shapes.Polygon(points)
+            # Polygons compare by identity: threads racing to build the same one
+            # must all get the first
+            polygon = self._polygons.setdefault(i, polygon)
+        return polygon
+
+
+class Hierarchy(object):
+
+    """
+        A flat, array-backed copy of Kirkpatrick's search DAG. Nodes are triangles
+        numbered from 0 (the root); the children of node i are
+        children[offsets[i]:offsets[i + 1]], and each leaf holds the index of the
+        input region it belongs to (or -1 for the fabricated boundary triangles).
+        Queries only ever touch integer indices and flat float arrays, which are
+        read-only, so one hierarchy can serve any number of threads at once. An
+        optional grid.Grid lets queries start below the root.
+    """
+
+    def __init__(self, vertices, offsets, children, leaves, regions):
+        for array in (vertices, offsets, children, leaves):
+            array.setflags(write=False)
+        self.vertices = vertices
+        self.offsets = offsets
+        self.children = children
+        self.leaves = leaves
+        self.regions = regions
+        self.grid = None
+        self._neighbors = None
+
+    @classmethod
+    def from_dag(cls, dag, leaf_ids, regions):
+        """
+            Compiles a search DAG.
+
+            Arguments:
+            dag -- the DirectedGraph built by Locator.preprocess
+            leaf_ids -- a map from each leaf triangle of dag to its region's index
+            regions -- the input regions
+
+            Returns: the compiled hierarchy
+        """
+        root = dag.root()
+        index = {root: 0}
+        order = [root]
+        edges = []
+        # Number nodes in BFS order, stopping at the region leaves
+        for node in order:
+            kids = []
+            if node not in leaf_ids:
+                for child in dag.e[node]:
+                    if child not in index:
+                        index[child] = len(order)
+                        order.append(child)
+                    kids.append(index[child])
+            edges.append(kids)
+
+        m = len(order)
+        vertices = np.empty((m, 6), dtype=np.float64)
+        leaves = np.empty(m, dtype=np.int64)
+        offsets = np.zeros(m + 1, dtype=np.int64)
+        for i, node in enumerate(order):
+            vertices[i] = [c for p in node.points for c in (p.x, p.y)]
+            leaves[i] = leaf_ids.get(node, -1)
+            offsets[i + 1] = offsets[i] + len(edges[i])
+        children = np.array([j for kids in edges for j in kids], dtype=np.int64)
+
+        return cls(vertices, offsets, children, leaves, regions)
+
+    @classmethod
+    def from_buffer(cls, buf):
+        """
+            Opens a hierarchy laid out as by save in any buffer (e.g., an mmap).
+            The arrays are views into 'buf': nothing is copied or deserialized.
+        """
+        magic, version, flags, m, e, r, p = struct.unpack_from(HEADER, buf, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a saved point location hierarchy.")
+        if version != VERSION:
+            raise ValueError("Unsupported hierarchy format version: %d" % version)
+
+        arrays = {}
+        for name, dtype, shape, offset in layout(m, e, r, p)[0]:
+            count = int(np.prod(shape))
+            if count:
+                array = np.frombuffer(buf, dtype=dtype, count=count, offset=offset)
+            else:
+                array = np.empty(0, dtype=dtype)
+            array.flags.writeable = False
+            arrays[name] = array.reshape(shape)
+
+        regions = Regions(arrays['region_offsets'], arrays['region_points'])
+        return cls(arrays['vertices'], arrays['offsets'], arrays['children'],
+                   arrays['leaves'], regions)
+
+    @classmethod
+    def load(cls, path):
+        """Memory-maps the hierarchy saved at 'path'."""
+        with open(path, 'rb') as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls.from_buffer(buf)
+
+    @staticmethod
+    def shared_path(name):
+        """Returns the path of the shared memory segment called 'name'."""
+        return os.path.join(SHARED_DIR, name)
+
+    def publish(self, name=None):
+        """
+            Publishes the hierarchy in shared memory, for any process on the host
+            to attach to. The segment appears atomically, fully written.
+
+            Returns: the segment's name
+        """
+        if name is None:
+            name = 'point-location-%d-%s' % (os.getpid(), uuid.uuid4().hex)
+        path = self.shared_path(name)
+        partial = path + '.partial'
+        self.save(partial)
+        os.rename(partial, path)
+        return name
+
+    @classmethod
+    def attach(cls, name):
+        """
+            Maps the hierarchy published as 'name', read-only. Pages are shared
+            between every attached process rather than copied.
+        """
+        return cls.load(cls.shared_path(name))
+
+    @classmethod
+    def unlink(cls, name):
+        """
+            Removes the segment published as 'name'. Attached processes keep their
+            mapping until they exit.
+        """
+        os.remove(cls.shared_path(name))
+
+    def contents(self):
+        """
+            Returns: the saved header of this hierarchy, the layout of the arrays
+            following it (see layout), the arrays by name, and the total size in bytes
+        """
+        regions = Regions.from_polygons(self.regions)
+        arrays = {
+            'vertices': self.vertices,
+            'offsets': self.offsets,
+            'children': self.children,
+            'leaves': self.leaves,
+            'region_offsets': regions.offsets,
+            'region_points': regions.points,
+        }
+        counts = (len(self.vertices), len(self.children), len(regions),
+                  len(regions.points))
+        header = struct.pack(HEADER, MAGIC, VERSION, 0, *counts)
+        entries, size = layout(*counts)
+        return header.ljust(HEADER_SIZE, b'\0'), entries, arrays, size
+
+    def save(self, path):
+        """
+            Saves the hierarchy, along with its regions' vertices, to 'path' as a
+            header followed by flat little-endian arrays, which load (or any
+            reader using np.memmap) can map without deserializing objects.
+        """
+        header, entries, arrays, size = self.contents()
+        with open(path, 'wb') as f:
+            f.write(header)
+            for name, dtype, shape, offset in entries:
+                f.write(np.ascontiguousarray(arrays[name], dtype=dtype).tobytes())
+
+    def __len__(self):
+        return len(self.vertices)
+
+    def depth(self):
+        """Returns the length of the longest path from the root to a leaf."""
+        depth = 0
+        frontier = np.zeros(1, dtype=np.int64)
+        while True:
+            start = self.offsets[frontier]
+            degree = self.offsets[frontier + 1] - start
+            if not degree.any():
+                return depth
+            # Gather the children of every node on the frontier
+            first = np.repeat(start - np.cumsum(degree) + degree, degree)
+            frontier = np.unique(self.children[first + np.arange(degree.sum())])
+            depth += 1
+
+    def neighbors(self):
+        """
+            Returns an (m, 3) array giving, for each leaf, the leaf across each of
+            its edges (edge k runs from vertex k to vertex k + 1), or -1 where
+            there is none; rows of internal nodes are all -1. Leaves tile the root,
+            so this is the adjacency of the final triangulation. Built on first use.
+        """
+        if self._neighbors is not None:
+            return self._neighbors
+
+        leaves = np.flatnonzero(np.diff(self.offsets) == 0)
+        corners = self.vertices[leaves].reshape(-1, 3, 2)
+        a = corners.reshape(-1, 2)
+        b = corners[:, [1, 2, 0]].reshape(-1, 2)
+
+        # Key each edge by its endpoints, in lexicographic order
+        swap = (a[:, 0] > b[:, 0]) | ((a[:, 0] == b[:, 0]) & (a[:, 1] > b[:, 1]))
+        keys = np.where(swap[:, None], np.hstack((b, a)), np.hstack((a, b)))
+        order = np.lexsort(keys.T[::-1])
+        keys = keys[order]
+        shared = np.flatnonzero((keys[1:] == keys[:-1]).all(axis=1))
+        first, second = order[shared], order[shared + 1]
+
+        neighbors = np.empty((len(self.vertices), 3), dtype=np.int64)
+        neighbors.fill(-1)
+        owner = leaves[np.arange(len(a)) // 3]
+        neighbors[owner[first], first % 3] = owner[second]
+        neighbors[owner[second], second % 3] = owner[first]
+        neighbors.setflags(write=False)
+        self._neighbors = neighbors
+        return neighbors
+
+    def polygon(self, i):
+        """Returns node i as a Triangle."""
+        ax, ay, bx, by, cx, cy = self.vertices[i].tolist()
+        return shapes.Triangle(shapes.Point(ax, ay), shapes.Point(bx, by),
+                               shapes.Point(cx, cy))
+
+    def contains(self, i, x, y):
+        """Returns True if (x, y) lies in node i (edges included)."""
+        ax, ay, bx, by, cx, cy = self.vertices[i].tolist()
+        # Signs within their error bound are settled exactly (see geo.predicates)
+        l = (bx - ax) * (y - ay)
+        r = (by - ay) * (x - ax)
+        d1 = l - r
+        if abs(d1) < ERROR_BOUND * (abs(l) + abs(r)):
+            d1 = orient(ax, ay, bx, by, x, y)
+        l = (cx - bx) * (y - by)
+        r = (cy - by) * (x - bx)
+        d2 = l - r
+        if abs(d2) < ERROR_BOUND * (abs(l) + abs(r)):
+            d2 = orient(bx, by, cx, cy, x, y)
+        if (d1 > 0 and d2 < 0) or (d1 < 0 and d2 > 0):
+            return False
+        l = (ax - cx) * (y - cy)
+        r = (ay - cy) * (x - cx)
+        d3 = l - r
+        if abs(d3) < ERROR_BOUND * (abs(l) + abs(r)):
+            d3 = orient(cx, cy, ax, ay, x, y)
+        return ((d1 >= 0 and d2 >= 0 and d3 >= 0)
+                or (d1 <= 0 and d2 <= 0 and d3 <= 0))
+
+    def locate(self, x, y):
+        """Returns the leaf containing (x, y), or -1 if there is none."""
+        x, y = float(x), float(y)
+        curr = 0 if self.grid is None else self.grid.lookup(x, y)
+        if curr == 0 and not self.contains(0, x, y):
+            return -1
+
+        offsets = self.offsets
+        children = self.children
+        start, end = offsets[curr], offsets[curr + 1]
+        while start < end:
+            for child in children[start:end].tolist():
+                if self.contains(child, x, y):
+                    curr = child
+                    break
+            else:
+                # Lost between children (only possible through rounding)
+                return -1
+            start, end = offsets[curr], offsets[curr + 1]
+
+        return curr
+
+    def trace(self, x, y):
+        """
+            Locates (x, y) like locate, also counting the work done.
+
+            Returns: the leaf (or -1), the number of levels descended, and the
+            number of children tested
+        """
+        x, y = float(x), float(y)
+        curr = 0 if self.grid is None else self.grid.lookup(x, y)
+        if curr == 0 and not self.contains(0, x, y):
+            return -1, 0, 0
+
+        offsets = self.offsets
+        children = self.children
+        levels = tested = 0
+        start, end = offsets[curr], offsets[curr + 1]
+        while start < end:
+            levels += 1
+            for child in children[start:end].tolist():
+                tested += 1
+                if self.contains(child, x, y):
+                    curr = child
+                    break
+            else:
+                return -1, levels, tested
+            start, end = offsets[curr], offsets[curr + 1]
+
+        return curr, levels, tested
+
+    def locate_many(self, xy, trace=False):
+        """
+            Locates an (N, 2) array of points, descending one level at a time for
+            all of them together.
+
+            Returns: an (N,) array of the leaf containing each point (or -1); if
+            trace, also (N,) arrays of the levels descended and children tested
+            for each point
+        """
+        xy = spatial.toArray(xy)
+        n = len(xy)
+        leaf = np.empty(n, dtype=np.int64)
+        leaf.fill(-1)
+        if trace:
+            levels = np.zeros(n, dtype=np.int64)
+            tested = np.zeros(n, dtype=np.int64)
+
+        if self.grid is None:
+            node = np.zeros(n, dtype=np.int64)
+        else:
+            node = self.grid.lookup_many(xy)
+        active = np.flatnonzero((node > 0) | contains_rows(self.vertices[:1], xy))
+        node = node[active]
+        while len(active):
+            start = self.offsets[node]
+            degree = self.offsets[node + 1] - start
+
+            # Points that reached a leaf are done
+            done = degree == 0
+            leaf[active[done]] = node[done]
+            keep = ~done
+            active, node, start, degree = (active[keep], node[keep],
+                                           start[keep], degree[keep])
+            if trace:
+                levels[active] += 1
+
+            # Hand each point to the first child containing it
+            found = np.empty(len(active), dtype=np.int64)
+            found.fill(-1)
+            k = 0
+            while True:
+                pending = np.flatnonzero((found < 0) & (degree > k))
+                if not len(pending):
+                    break
+                child = self.children[start[pending] + k]
+                hit = contains_rows(self.vertices[child], xy[active[pending]])
+                found[pending[hit]] = child[hit]
+                if trace:
+                    tested[active[pending]] += 1
+                k += 1
+
+            keep = found >= 0
+            active, node = active[keep], found[keep]
+
+        if trace:
+            return leaf, levels, tested
+        return leaf
+
+    def regions_of(self, leaf):
+        """Maps an array of leaves (as returned by locate_many) to region indices."""
+        return np.where(leaf >= 0, self.leaves[leaf], -1)
@@ -1,12 +1,61 @@
+import numbers
+import threading
+
+import numpy as np
+
 from geo import shapes, spatial
+from cache import ResultCache, MAX_ENTRIES
 import min_triangle
+from cursor import Cursor, MAX_STEPS
 from graph import UndirectedGraph, DirectedGraph
+from grid import Grid, MAX_CELLS
+from hierarchy import Hierarchy
+from parallel import WorkerPool
+from patch import PatchedStructure
+from stats import QueryStats
+import stream
+from trapezoid import TrapezoidalMap
+
+ENGINES = ('kirkpatrick', 'trapezoid')
 
 
 class Locator(object):
 
-    def __init__(self, regions, outline=None):
-        self.preprocess(regions, outline)
+    def __init__(self, regions, outline=None, max_degree=8, strategy='min-degree',
+                 engine='kirkpatrick', grid=None, max_cells=MAX_CELLS):
+        """
+            Arguments:
+            regions -- a set of non-overlapping polygons that tile some part of the plane
+            outline -- the polygonal outline of regions (default: their convex hull)
+            max_degree -- the maximum degree of the vertices removed on each round
+            (too small a bound can leave none to remove: this raises a ValueError)
+            strategy -- the order in which each round picks vertices to remove:
+            'min-degree' (deterministic, lowest degree first), 'arbitrary', or a
+            function, see UndirectedGraph.independent_set
+            engine -- the search structure answering queries: 'kirkpatrick' (the
+            triangulation hierarchy) or 'trapezoid' (a randomized trapezoidal map
+            of the regions' edges, see trapezoid.TrapezoidalMap, which ignores
+            outline, max_degree and strategy)
+            grid -- if given, the resolution of a grid.Grid letting queries skip
+            the top of the hierarchy (see Locator.build_grid)
+            max_cells -- the most cells the grid may use
+        """
+        if engine not in ENGINES:
+            raise ValueError("Unknown engine: %s" % engine)
+        self.outline = outline
+        self.max_degree = max_degree
+        self.strategy = strategy
+        self.engine = engine
+        self.query_stats = None
+        self.cache = None
+        self.lock = threading.Lock()
+        self.rebuild_error = None
+        if engine == 'trapezoid':
+            self.preprocess_trapezoids(regions)
+        else:
+            self.preprocess(regions, outline)
+        if grid:
+            self.build_grid(grid, max_cells)
 
     def preprocess(self, regions, outline=None):
         def process_boundary(regions, outline=None):
@@ -38,7 +87,7 @@ class Locator(object):
                 return bounding_tri, bounding_regions
 
             if not outline:
-                points = reduce(lambda ps, r: ps + r.points, regions, [])
+                points = reduce(lambda ps, r: ps + list(r.points), regions, [])
                 outline = spatial.convexHull(points)
             return add_bounding_triangle(outline)
 
@@ -55,7 +104,7 @@ class Locator(object):
             """
             frontier = []
 
-            for region in regions:
+            for idx, region in enumerate(regions):
                 self.dag.add_node(region)
 
                 # If region is not a triangle, triangulate
@@ -67,104 +116,177 @@ class Locator(object):
                         self.dag.connect(triangle, region)
                         # Add to frontier
                         frontier.append(triangle)
+                        if idx < len(self.regions):
+                            self.leaf_ids[triangle] = idx
                 else:
                     frontier.append(region)
+                    if idx < len(self.regions):
+                        self.leaf_ids[region] = idx
 
             return frontier
 
-        def remove_independent_set(regions):
+        def connect_regions(regions):
             """
-                Processes a set of regions, detecting and removing an independent set
-                of vertices from the regions' graph representation, and re-triangulating
-                the resulting holes.
+                Builds the vertex graph of a set of regions, along with an index of
+                the regions incident to each vertex. Both are then kept up to date
+                by remove_independent_set, rather than rebuilt on every round.
 
                 Arguments:
                 regions -- a set of non-overlapping polygons that tile some part of the plane
 
-                Returns: a new set of regions covering the same subset of the plane, with fewer vertices
+                Returns: the regions' graph, and a map from each vertex to its regions
             """
-            # Take note of which points are in which regions
-            points_to_regions = {}
-            for idx, region in enumerate(regions):
-                for point in region.points:
-                    if point in points_to_regions:
-                        points_to_regions[point].add(idx)
-                        continue
-
-                    points_to_regions[point] = set([idx])
-
-            # Connect graph
             g = UndirectedGraph()
+            points_to_regions = {}
             for region in regions:
                 for idx in range(region.n):
                     u = region.points[idx % region.n]
                     v = region.points[(idx + 1) % region.n]
                     if not g.contains(u):
                         g.add_node(u)
+                        points_to_regions[u] = []
                     if not g.contains(v):
                         g.add_node(v)
+                        points_to_regions[v] = []
                     g.connect(u, v)
+                    points_to_regions[u].append(region)
 
-            # Avoid adding points from outer triangle
-            removal = g.independent_set(8, avoid=bounding_triangle.points)
+            return g, points_to_regions
+
+        def remove_independent_set(g, points_to_regions):
+            """
+                Detects and removes an independent set of vertices from the regions'
+                graph representation, re-triangulating the resulting holes. Only the
+                star of each removed vertex is touched: 'g' and 'points_to_regions'
+                are updated in place.
+
+                Arguments:
+                g -- the graph of the current regions' vertices and edges
+                points_to_regions -- a map from each vertex to a list of its incident regions
+
+                Returns: the change in the number of regions
+            """
+            def fill_hole(p, affected_regions):
+                """
+                    Triangulates the star-shaped hole left by removing p, by clipping
+                    ears off the link of p (its neighbors, in CCW order). Vertex b,
+                    between a and c on the link, is an ear if abc turns CCW and p does
+                    not lie right of ac: then abc lies within the old triangles pab
+                    and pbc, and what remains is still star-shaped from p.
+
+                    Each edge of the link remembers the old triangles in its wedge
+                    (between the rays from p through its endpoints), which are
+                    exactly those a new triangle overlaps, so no geometric
+                    intersection tests are needed.
+
+                    Arguments:
+                    p -- the removed vertex
+                    affected_regions -- the triangles incident to p
+
+                    Returns: a list of the new triangles, each with the list of old
+                    triangles it overlaps
+                """
+                # Order the link: each triangle contributes the edge opposite p
+                following = {}
+                for region in affected_regions:
+                    i = region.points.index(p)
+                    u, v = region.points[(i + 1) % 3], region.points[(i + 2) % 3]
+                    if shapes.orientation(p, u, v) < 0:
+                        u, v = v, u
+                    following[u] = (v, region)
+                link = []
+                wedges = []
+                u = affected_regions[0].points[affected_regions[0].points.index(p) - 1]
+                for k in range(len(affected_regions)):
+                    v, region = following[u]
+                    link.append(u)
+                    wedges.append([region])
+                    u = v
+
+                n = len(link)
+                after = [(i + 1) % n for i in range(n)]
+                before = [(i - 1) % n for i in range(n)]
+                triangles = []
+                i = 0
+                misses = 0
+                while n > 3:
+                    a, c = before[i], after[i]
+                    if (shapes.orientation(link[a], link[i], link[c]) > 0
+                            and shapes.orientation(link[a], link[c], p) >= 0):
+                        wedges[a] = wedges[a] + wedges[i]
+                        triangles.append((shapes.Triangle(link[a], link[i], link[c]),
+                                          wedges[a]))
+                        after[a], before[c] = c, a
+                        n -= 1
+                        misses = 0
+                        # Clipping i may have made an ear of a
+                        i = a
+                    else:
+                        i = c
+                        misses += 1
+                        if misses > n:
+                            raise ValueError("Degenerate triangles around %s." % p)
+
+                # The last triangle overlaps the wedges of its edges that face p
+                # (p may lie on one of them)
+                a, b = after[i], after[after[i]]
+                overlapped = []
+                for u, v in ((i, a), (a, b), (b, i)):
+                    if shapes.orientation(link[u], link[v], p) > 0:
+                        overlapped.extend(wedges[u])
+                triangles.append((shapes.Triangle(link[i], link[a], link[b]),
+                                  overlapped))
+                return triangles
 
-            # Track unaffected regions
-            unaffected_regions = set([i for i in range(len(regions))])
-            new_regions = []
+            # Avoid adding points from outer triangle
+            removal = g.independent_set(self.max_degree,
+                                        avoid=bounding_triangle.points,
+                                        strategy=self.strategy,
+                                        key=lambda p: (p.x, p.y))
+            # Otherwise the next round would find the same nothing, forever
+            if not removal:
+                raise ValueError("No vertex of degree at most %d left to remove; "
+                                 "use a larger max_degree." % self.max_degree)
+
+            delta = 0
             for p in removal:
                 # Take note of affected regions
-                affected_regions = points_to_regions[p]
-                unaffected_regions.difference_update(points_to_regions[p])
-
-                def calculate_bounding_polygon(p, affected_regions):
-                    edges = []
-                    point_locations = {}
-                    for j, i in enumerate(affected_regions):
-                        edge = set(regions[i].points)
-                        edge.remove(p)
-                        edges.append(edge)
-                        for v in edge:
-                            if v in point_locations:
-                                point_locations[v].add(j)
-                            else:
-                                point_locations[v] = set([j])
-
-                    boundary = []
-                    edge = edges.pop()
-                    for v in edge:
-                        point_locations[v].remove(len(edges))
-                        boundary.append(v)
-                    for k in range(len(affected_regions) - 2):
-                        v = boundary[-1]
-                        i = point_locations[v].pop()
-                        edge = edges[i]
-                        edge.remove(v)
-                        u = edge.pop()
-                        point_locations[u].remove(i)
-                        boundary.append(u)
-
-                    return shapes.Polygon(boundary)
-
-                # triangulate hole
-                poly = calculate_bounding_polygon(p, affected_regions)
-                triangles = spatial.triangulatePolygon(poly)
-                for triangle in triangles:
+                affected_regions = points_to_regions.pop(p)
+                g.remove_node(p)
+
+                # Triangulate hole, linking each triangle to those it overlaps
+                triangles = []
+                for triangle, overlapped in fill_hole(p, affected_regions):
                     self.dag.add_node(triangle)
-                    for j in affected_regions:
-                        region = regions[j]
+                    for region in overlapped:
                         self.dag.connect(triangle, region)
-                    new_regions.append(triangle)
+                    triangles.append(triangle)
 
-            for i in unaffected_regions:
-                new_regions.append(regions[i])
+                # Patch the star of p
+                for region in affected_regions:
+                    for v in region.points:
+                        if not v == p:
+                            points_to_regions[v].remove(region)
+                for triangle in triangles:
+                    for idx in range(3):
+                        u = triangle.points[idx]
+                        v = triangle.points[(idx + 1) % 3]
+                        g.connect(u, v)
+                        points_to_regions[u].append(triangle)
+
+                delta += len(triangles) - len(affected_regions)
 
-            return new_regions
+            return delta
 
         self.dag = DirectedGraph()
 
         # Store copy of regions
         self.regions = regions
 
+        # Map the leaves of the DAG (triangular regions, and the triangles of
+        # each non-triangular region) to the index of their region
+        self.leaf_ids = {}
+
         # Calculate, triangulate bounding triangle
         bounding_triangle, boundary = process_boundary(regions, outline)
 
@@ -173,37 +295,400 @@ class Locator(object):
 
         # Iterate until only bounding triangle remains
         frontier = triangulate_regions(regions + boundary)
-        while len(frontier) > 1:
-            frontier = remove_independent_set(frontier)
+        g, points_to_regions = connect_regions(frontier)
+        remaining = len(frontier)
+        self.rounds = 0
+        while remaining > 1:
+            remaining += remove_independent_set(g, points_to_regions)
+            self.rounds += 1
+
+        self.compile()
+
+    def preprocess_trapezoids(self, regions):
+        self.dag = None
+        self.leaf_ids = None
+        self.boundary = None
+        self.rounds = None
+        self.regions = regions
+        self.structure = TrapezoidalMap(regions)
+
+    def build_info(self):
+        """
+            Returns: the number of rounds of vertex removal (None for the
+            trapezoid engine), the depth of the compiled search structure (the
+            most levels a query descends), and its number of nodes
+        """
+        return {
+            'rounds': self.rounds,
+            'depth': self.structure.depth(),
+            'nodes': len(self.structure),
+        }
+
+    def compile(self):
+        """
+            Flattens the DAG into an array-backed Hierarchy, which serves all queries.
+            Called automatically at the end of preprocessing.
+        """
+        self.structure = Hierarchy.from_dag(self.dag, self.leaf_ids, self.regions)
+
+    def require_hierarchy(self):
+        if isinstance(self.structure, PatchedStructure):
+            raise ValueError("Not supported with replaced regions until rebuild().")
+        if not isinstance(self.structure, Hierarchy):
+            raise ValueError("Only supported by the kirkpatrick engine.")
+
+    def replace_regions(self, old, new):
+        """
+            Replaces some regions by others covering exactly the same area, so
+            that the regions still tile their outline, as rebuild requires. The
+            hierarchy is not rebuilt: the replacements made since the last
+            rebuild are indexed by a trapezoidal map of their own, consulted for
+            points in replaced regions (see patch.PatchedStructure). The new
+            structure is swapped in atomically: queries in flight finish on the
+            old one.
+
+            Other regions keep their indices. The new regions take the indices of
+            the old ones in order, and any extra are appended; if there are fewer,
+            the remaining old indices are left empty (None). save, publish,
+            locate_parallel and the grid need a rebuild() first.
+
+            Raises a ValueError, leaving the locator as it was, if the new regions
+            do not cover the old ones: their areas must match, and each new vertex
+            must lie in one of the old regions.
+
+            Arguments:
+            old -- the indices of the regions to remove, in self.regions
+            new -- the regions to add
+
+            Returns: the indices of the new regions
+        """
+        with self.lock:
+            structure = self.structure
+            regions = structure.regions
+            if isinstance(structure, PatchedStructure):
+                base = structure.base
+                overrides = dict(structure.overrides)
+            else:
+                base = structure
+                overrides = {}
+
+            ids = []
+            for i in old:
+                if not isinstance(i, numbers.Integral):
+                    raise TypeError("Regions are replaced by index, not %r." % (i,))
+                if not 0 <= i < len(regions) or regions[i] is None:
+                    raise IndexError("No region %d to replace." % i)
+                ids.append(int(i))
+            ids.extend(range(len(regions), len(regions) + len(new) - len(ids)))
+
+            removed = [regions[i] for i in ids
+                       if i < len(regions) and regions[i] is not None]
+            area = sum(spatial.area(region) for region in removed)
+            if (abs(sum(spatial.area(region) for region in new) - area) > 1e-9 * area
+                    or not all(any(region.contains(p) for region in removed)
+                               for polygon in new for p in polygon.points)):
+                raise ValueError("Replacements must cover exactly the regions they replace.")
+
+            for i in ids[len(new):]:
+                overrides[i] = None
+            for i, region in zip(ids, new):
+                overrides[i] = region
+
+            patched = PatchedStructure(base, overrides)
+            self.regions = patched.regions
+            self.structure = patched
+            return ids[:len(new)]
+
+    def rebuild(self, background=False):
+        """
+            Preprocesses the current regions from scratch, folding in any
+            replace_regions updates, and swaps the result in atomically; queries
+            keep using the old structure until then. Region indices are kept
+            (removed ones stay empty). Further updates wait for the rebuild.
+
+            An exception raised by a background rebuild is kept, and raised by
+            the next call to rebuild.
 
-    def locate(self, p):
-        """Locates the point p in one of the initial regions"""
-        polygon, valid = self.annotatedLocate(p)
+            Arguments:
+            background -- if True, rebuild in a daemon thread, and return it
+
+            Returns: the thread, if background
+        """
+        error, self.rebuild_error = self.rebuild_error, None
+        if error is not None:
+            raise error
+
+        if background:
+            def run():
+                try:
+                    self.rebuild()
+                except Exception as error:
+                    self.rebuild_error = error
+
+            thread = threading.Thread(target=run)
+            thread.daemon = True
+            thread.start()
+            return thread
+
+        with self.lock:
+            structure = self.structure
+            regions = list(structure.regions)
+            ids = [i for i, region in enumerate(regions) if region is not None]
+            fresh = type(self)([regions[i] for i in ids], outline=self.outline,
+                               max_degree=self.max_degree, strategy=self.strategy,
+                               engine=self.engine)
+
+            rebuilt = fresh.structure
+            if len(ids) < len(regions):
+                # Renumber leaves with the indices of the full region list
+                ids = np.array(ids, dtype=np.int64)
+                rebuilt.leaves = np.where(rebuilt.leaves >= 0, ids[rebuilt.leaves], -1)
+                rebuilt.leaves.setflags(write=False)
+                if fresh.leaf_ids is not None:
+                    fresh.leaf_ids = dict((t, int(ids[i]))
+                                          for t, i in fresh.leaf_ids.items())
+            rebuilt.regions = regions
+
+            grid = getattr(getattr(structure, 'base', structure), 'grid', None)
+            if grid is not None:
+                rebuilt.grid = Grid(rebuilt, grid.resolution, grid.max_cells)
+
+            self.dag = fresh.dag
+            self.leaf_ids = fresh.leaf_ids
+            self.boundary = fresh.boundary
+            self.rounds = fresh.rounds
+            self.regions = regions
+            self.structure = rebuilt
+
+    def build_grid(self, resolution, max_cells=MAX_CELLS):
+        """
+            Indexes the hierarchy with a uniform grid over the regions, so that
+            queries start from the deepest node containing their cell, and those
+            in cells within a single region are answered without any test.
+
+            Arguments:
+            resolution -- the number of cells along the longer side of the regions'
+            bounding box
+            max_cells -- the most cells to use (8 bytes each), lowering the
+            resolution if needed
+
+            Returns: the Grid
+        """
+        self.require_hierarchy()
+        self.structure.grid = Grid(self.structure, resolution, max_cells)
+        return self.structure.grid
+
+    def save(self, path):
+        """Saves the preprocessed hierarchy and regions to 'path' (see Hierarchy.save)."""
+        self.require_hierarchy()
+        self.structure.save(path)
+
+    @classmethod
+    def load(cls, path):
+        """
+            Returns a Locator for the hierarchy saved at 'path'. The file is
+            memory-mapped, so no preprocessing or deserialization takes place; the
+            DAG is not available, and regions are rebuilt from their vertices.
+        """
+        return cls.from_structure(Hierarchy.load(path))
+
+    def publish(self, name=None):
+        """
+            Publishes the preprocessed hierarchy in shared memory, so that worker
+            processes can attach to it (see Locator.attach) instead of each
+            preprocessing and holding their own copy. The publisher is responsible
+            for calling Locator.unpublish(name) once workers are done.
+
+            Returns: the name of the shared segment
+        """
+        self.require_hierarchy()
+        return self.structure.publish(name)
+
+    @classmethod
+    def attach(cls, name):
+        """Returns a read-only Locator over the hierarchy published as 'name'."""
+        return cls.from_structure(Hierarchy.attach(name))
+
+    @staticmethod
+    def unpublish(name):
+        """Removes the shared segment published as 'name'."""
+        Hierarchy.unlink(name)
+
+    @classmethod
+    def from_structure(cls, structure):
+        """Returns a Locator answering queries from an existing Hierarchy."""
+        locator = cls.__new__(cls)
+        locator.dag = None
+        locator.leaf_ids = None
+        locator.boundary = None
+        locator.rounds = None
+        locator.outline = None
+        locator.max_degree = 8
+        locator.strategy = 'min-degree'
+        locator.engine = 'kirkpatrick'
+        locator.regions = structure.regions
+        locator.structure = structure
+        locator.query_stats = None
+        locator.cache = None
+        locator.lock = threading.Lock()
+        locator.rebuild_error = None
+        return locator
+
+    def enable_stats(self, callback=None):
+        """
+            Starts recording the work done by each query (levels descended,
+            children tested and containment tests) into self.query_stats.
+
+            Arguments:
+            callback -- an optional hook, see QueryStats
+
+            Returns: the QueryStats
+        """
+        self.query_stats = QueryStats(callback)
+        return self.query_stats
+
+    def disable_stats(self):
+        self.query_stats = None
+
+    def enable_cache(self, maxsize=MAX_ENTRIES, quantum=None):
+        """
+            Starts caching the results of locate and annotatedLocate in
+            self.cache, so that repeated points skip the descent. The cache is
+            emptied whenever the locator is rebuilt. Hits are not recorded in
+            query_stats.
+
+            Arguments:
+            maxsize -- the most results to keep, evicting the least recently used
+            quantum -- if given, points are keyed on a grid with cells of this
+            side, sharing the result of the first point located in their cell
+
+            Returns: the ResultCache
+        """
+        self.cache = ResultCache(maxsize, quantum)
+        return self.cache
+
+    def disable_cache(self):
+        self.cache = None
+
+    def locate(self, p, as_id=False):
+        """
+            Locates the point p in one of the initial regions. If as_id, returns
+            the region's index in self.regions (or -1) instead of the region.
+        """
+        region, valid = self.annotatedLocate(p, as_id)
 
         # Result might be valid polygon
         if not valid:
-            return None
+            return -1 if as_id else None
 
-        return polygon
+        return region
 
-    def annotatedLocate(self, p):
+    def annotatedLocate(self, p, as_id=False):
         """
             Locates the point p, returning the region and whether or not
             the region was one of the initial regions (i.e., False if the
-            region was a fabricated boundary region).
+            region was a fabricated boundary region; the trapezoid engine reports
+            None for those). If as_id, the region
+            is given by its index in self.regions, with -1 for points outside
+            every initial region.
         """
-        curr = self.dag.root()
-        if not curr.contains(p):
-            return None, False
+        # Read each attribute once, so that concurrent updates (rebuild,
+        # disable_stats...) cannot switch them mid-query
+        structure = self.structure
+        cache = self.cache
+        stats = self.query_stats
+        if cache is not None:
+            leaf = cache.get(structure, p.x, p.y)
+            if leaf is not None:
+                return self.resolve(structure, leaf, as_id)
+
+        if stats is None:
+            leaf = structure.locate(p.x, p.y)
+        else:
+            leaf, levels, tested = structure.trace(p.x, p.y)
+            stats.record(levels, tested)
+
+        if cache is not None:
+            cache.put(structure, p.x, p.y, leaf)
+        return self.resolve(structure, leaf, as_id)
+
+    def resolve(self, structure, leaf, as_id=False):
+        """Maps a leaf of 'structure' (or -1) to the result of annotatedLocate."""
+        if leaf < 0:
+            return (-1 if as_id else None), False
 
-        children = self.dag.e[curr]
-        while children:
-            for region in children:
-                if region.contains(p):
-                    curr = region
-                    break
+        # Is the final region an exterior region?
+        region_id = int(structure.leaves[leaf])
+        if as_id:
+            return region_id, region_id >= 0
+        if region_id < 0:
+            return structure.polygon(leaf), False
+        return structure.regions[region_id], True
+
+    def cursor(self, max_steps=MAX_STEPS):
+        """
+            Returns a Cursor for locating a stream of nearby points, each by a walk
+            from the last one's triangle: locator.cursor().locate(p).
+        """
+        self.require_hierarchy()
+        return Cursor(self, max_steps)
 
-            children = self.dag.e[curr]
+    def locate_many(self, xy):
+        """
+            Locates a batch of points at once, descending the hierarchy for all of
+            them together, one level at a time, with vectorized containment tests.
 
-        # Is the final region an exterior region?
-        return curr, curr in self.regions
+            Arguments:
+            xy -- an (N, 2) array of coordinates (or anything convertible to one)
+
+            Returns: an (N,) integer array holding, for each point, the index of
+            its region in self.regions, or -1 if it lies outside every region
+        """
+        structure = self.structure
+        stats = self.query_stats
+        if stats is None:
+            return structure.regions_of(structure.locate_many(xy))
+
+        leaf, levels, tested = structure.locate_many(xy, trace=True)
+        stats.record_many(levels, tested)
+        return structure.regions_of(leaf)
+
+    def locate_stream(self, source, batch_size=100000, output=None, format=None):
+        """
+            Locates a stream of points in fixed-size batches, reading them lazily so
+            that memory use is bounded by the batch size, however large the input.
+
+            Arguments:
+            source -- a path or open file holding CSV lines (x and y in the first
+            two columns, with an optional header) or raw little-endian float64
+            pairs, or an iterable of Points or (x, y) pairs
+            batch_size -- the number of points located at a time
+            output -- if given, a path or open file to write the region ids to,
+            as text lines or little-endian int64 (see stream.write_ids)
+            format -- 'csv' or 'binary', for both source and output (default:
+            guessed from their extensions)
+
+            Returns: a generator of (N,) region id arrays, as from locate_many; or,
+            with an output, the number of points located
+        """
+        batches = stream.locate_batches(self, source, batch_size, format)
+        if output is None:
+            return batches
+        return stream.write_ids(batches, output, format)
+
+    def locate_parallel(self, xy, workers=None, chunk_size=100000):
+        """
+            Locates a batch of points across a pool of processes, which attach to
+            a shared copy of the hierarchy rather than receiving their own. To
+            reuse the pool across batches, use parallel.WorkerPool directly.
+
+            Arguments:
+            xy -- an (N, 2) array of coordinates (or anything convertible to one)
+            workers -- the number of processes (default: one per CPU)
+            chunk_size -- the number of points handed to a worker at a time
+
+            Returns: the same as locate_many
+        """
+        self.require_hierarchy()
+        with WorkerPool(self.structure, workers) as pool:
+            return pool.locate(xy, chunk_size)
@@ -1,206 +1,303 @@
-from math import sqrt, ceil, floor
+from math import sqrt, ceil, floor, pi
+import multiprocessing
 
-from geo.shapes import Point, Line, Triangle, Polygon, ccw
+import numpy as np
+
+from geo.predicates import orient
+from geo.shapes import Point, Triangle, Polygon
 from geo.spatial import convexHull
 from geo.generator import randomConvexPolygon
 from geo.drawer import plot, show
 
+# The tolerance with which a triangle's midpoints must touch the polygon,
+# relative to the polygon's size
+EPSILON = 1e-9
 
-def minTriangle(poly):
-    """
-        Returns the triangle of minimum area enclosing a convex polygon.
-        Runs in Theta(n) time for convex polygons, or O(n*log(n)) for
-        concave polygons as convex hull must be computed.
+# How the line through a vertex and a point above it meets the polygon: beyond
+# the vertex on the side of the point, on the other side, or only at the vertex
+ABOVE, BELOW, CRITICAL = 1, -1, 0
 
-        Arguments:
-        poly -- the polygon to be enclosed
 
-        Returns: the triangle of minimum area enclosing polygon
+def convexVertices(xy):
     """
-    if not poly.isConvex():
-        poly = convexHull(poly.points)
+        Returns the vertices of a convex polygon as a counter-clockwise list of
+        (x, y) pairs, without repeated or collinear vertices.
+    """
+    xy = np.asarray(xy, dtype=np.float64)
+    x, y = xy[:, 0], xy[:, 1]
+    points = list(zip(x.tolist(), y.tolist()))
+    if np.dot(x, np.roll(y, -1)) < np.dot(y, np.roll(x, -1)):
+        points.reverse()
+
+    def turns(p, q, r):
+        return orient(p[0], p[1], q[0], q[1], r[0], r[1]) > 0
+
+    kept = []
+    for p in points:
+        while len(kept) >= 2 and not turns(kept[-2], kept[-1], p):
+            kept.pop()
+        if not kept or kept[-1] != p:
+            kept.append(p)
+    while len(kept) >= 3 and not turns(kept[-2], kept[-1], kept[0]):
+        kept.pop()
+    while len(kept) >= 3 and not turns(kept[-1], kept[0], kept[1]):
+        kept.pop(0)
+    return kept
+
+
+def intersection(p, d, q, e):
+    """
+        Returns the intersection of the lines through p along d, and through q
+        along e, or None if they are parallel.
+    """
+    det = d[0] * e[1] - d[1] * e[0]
+    if det == 0:
+        return None
+    t = ((q[0] - p[0]) * e[1] - (q[1] - p[1]) * e[0]) / det
+    return p[0] + t * d[0], p[1] + t * d[1]
 
-    n = poly.n
-    points = poly.points
 
-    # Check for degenerate cases
+def midpoint(p, q):
+    return (p[0] + q[0]) / 2, (p[1] + q[1]) / 2
+
+
+def enclosingTriangle(xy):
+    """
+        Returns the triangle of minimum area enclosing a convex polygon, given
+        as an (n, 2) array of its vertices, in Theta(n) time [O'Rourke 86].
+
+        Side i of the polygon runs from vertex i - 1 to vertex i. The sides
+        are kept as arrays, along with the vertex farthest from each (found
+        for all sides at once, from their directions), where b starts its
+        search; the triangle's side C is flush with each side in turn, while
+        a and b (where sides A and B touch the polygon) only ever move
+        forward, so that the n searches take Theta(n) together. Heights above
+        side C are cross products with it (times its length), so that
+        vertices at equal heights compare equal.
+
+        Returns: a (3, 2) array of the triangle's vertices (raises a ValueError
+        if the polygon has fewer than three non-collinear vertices)
+    """
+    points = convexVertices(xy)
+    n = len(points)
     if n < 3:
-        raise ValueError("Polygon must have at least three vertices.")
+        raise ValueError("Polygon must have at least three non-collinear vertices.")
     elif n == 3:
-        return Triangle(poly.points[0], poly.points[1], poly.points[2])
+        return np.array(points, dtype=np.float64)
+
+    xy = np.array(points, dtype=np.float64)
+    sides = xy - np.roll(xy, 1, axis=0)
+    # The directions of the sides, unwrapped so that they increase by 2*pi
+    # around the polygon; heights above side c grow along the sides pointing
+    # less than pi past it, so the farthest vertex ends the last of them
+    angles = np.arctan2(sides[:, 1], sides[:, 0])
+    angles[1:] = angles[0] + np.cumsum(np.diff(angles) % (2 * pi))
+    angles = np.concatenate((angles, angles + 2 * pi))
+    peaks = (np.searchsorted(angles, angles[:n] + pi, side='right') - 1).tolist()
+
+    X, Y = xy[:, 0].tolist(), xy[:, 1].tolist()
+    DX, DY = sides[:, 0].tolist(), sides[:, 1].tolist()
+    lengths = np.hypot(sides[:, 0], sides[:, 1]).tolist()
+    tolerance = EPSILON * float(np.ptp(xy, axis=0).max())
+
+    def vertex(i):
+        i %= n
+        return X[i], Y[i]
 
     def side(i):
-        """Return the side of polygon formed by vertices (i-1) and i."""
-        return Line(points[(i - 1) % n], points[i % n])
-
-    def isValidTriangle(vertex_A, vertex_B, vertex_C, a, b, c):
-        """Checks that a triangle composed of the given vertices is a valid local minimum."""
-        if not (vertex_A and vertex_B and vertex_C):
-            return False
-
-        midpoint_A = Line(vertex_C, vertex_B).midpoint()
-        midpoint_B = Line(vertex_A, vertex_C).midpoint()
-        midpoint_C = Line(vertex_A, vertex_B).midpoint()
-
-        def validateMidpoint(midpoint, index):
-            """Checks that a midpoint touches the polygon on the appropriate side."""
-            s = side(index)
-
-            # Account for floating-point errors
-            epsilon = 0.01
-
-            if s.vertical:
-                if midpoint.x != s.p1.x:
-                    return False
-                max_y = max(s.p1.y, s.p2.y) + epsilon
-                min_y = min(s.p1.y, s.p2.y) - epsilon
-                if not (midpoint.y <= max_y and midpoint.y >= min_y):
-                    return False
-
-                return True
+        """Returns side i as its starting vertex and direction."""
+        i %= n
+        return vertex(i - 1), (DX[i], DY[i])
+
+    def onSide(p, i):
+        """Checks that p lies on side i, up to the tolerance."""
+        (x0, y0), (dx, dy) = side(i)
+        length = lengths[i % n]
+        across = (dx * (p[1] - y0) - dy * (p[0] - x0)) / length
+        along = (dx * (p[0] - x0) + dy * (p[1] - y0)) / length
+        return abs(across) <= tolerance and -tolerance <= along <= length + tolerance
+
+    def atVertex(p, i):
+        x, y = vertex(i)
+        return abs(p[0] - x) <= tolerance and abs(p[1] - y) <= tolerance
+
+    best = None
+    best_area = None
+    a = 1
+    b = 2
+    for c in range(n):
+        (x0, y0), (ex, ey) = side(c)
+
+        def height(p):
+            """Returns the height of p above side C, times the side's length."""
+            return ex * (p[1] - y0) - ey * (p[0] - x0)
+
+        def h(i):
+            return height(vertex(i))
+
+        def gamma(i, a):
+            """Returns the point of side A's line twice as high as vertex i, if any."""
+            (px, py), (dx, dy) = side(a)
+            rate = ex * dy - ey * dx
+            if rate == 0:
+                return None
+            t = (2 * h(i) - h(a - 1)) / rate
+            return px + t * dx, py + t * dy
+
+        def crossing(g, i, a):
+            """
+                Returns how the line through vertex i and g, a point above it on
+                side A, meets the polygon.
+            """
+            # If i ends side A, the line is side A's, whatever g's rounding
+            if (i - a) % n == 0:
+                return ABOVE if h(i - 1) > h(i) else BELOW
+            if (i - a + 1) % n == 0:
+                return ABOVE if h(i + 1) > h(i) else BELOW
+
+            p, q, r = vertex(i - 1), vertex(i), vertex(i + 1)
+            forward = orient(q[0], q[1], r[0], r[1], g[0], g[1])
+            backward = orient(q[0], q[1], g[0], g[1], p[0], p[1])
+            if forward == 0:
+                # Along the next side
+                return ABOVE if h(i + 1) > h(i) else BELOW
+            if backward == 0:
+                return ABOVE if h(i - 1) > h(i) else BELOW
+            if forward == backward:
+                # Into the polygon, towards g or away from it
+                return ABOVE if forward > 0 else BELOW
+            return CRITICAL
+
+        a = max(a, c + 1)
+        b = max(b, a + 1, peaks[c] - 1)
+
+        # Move b onto the right chain, past the farthest vertex from C
+        while h(b + 1) >= h(b):
+            b += 1
+
+        # Move a if low, b if high
+        while h(b) > h(a):
+            g = gamma(a, a)
+            if g is not None and crossing(g, b, a) == BELOW:
+                b += 1
             else:
-                max_x = max(s.p1.x, s.p2.x) + epsilon
-                min_x = min(s.p1.x, s.p2.x) - epsilon
-                # Must touch polygon
-                if not (midpoint.x <= max_x and midpoint.x >= min_x):
-                    return False
-
-                if not s.atX(midpoint.x).close(midpoint):
-                    return False
-
-                return True
+                a += 1
 
-        return (validateMidpoint(midpoint_A, a) and validateMidpoint(midpoint_B, b)
-                and validateMidpoint(midpoint_C, c))
+        # Search for b tangency
+        while h(b) >= h(a - 1):
+            g = gamma(b, a)
+            if g is None or crossing(g, b, a) != BELOW:
+                break
+            b += 1
 
-    def triangleForIndex(c, a, b):
-        """Returns the minimal triangle with edge C flush to vertex c."""
-        a = max(a, c + 1) % n
-        b = max(b, c + 2) % n
         side_C = side(c)
+        side_A = side(a)
+        g = gamma(b, a)
+        if (g is not None and crossing(g, b, a) == ABOVE) or h(b) < h(a - 1):
+            # Side B is flush with side b; side A too, unless the midpoint of
+            # side B lies below a - 1, which side A must then touch
+            side_B = side(b)
+            ends = intersection(*(side_B + side_A)), intersection(*(side_B + side_C))
+            tangent_A = (None not in ends and
+                         height(midpoint(*ends)) < h(a - 1))
+            if tangent_A:
+                (px, py), (dx, dy) = side_B
+                rate = ex * dy - ey * dx
+                t = (2 * h(a - 1) - height((px, py))) / rate
+                p = vertex(a - 1)
+                side_A = p, (px + t * dx - p[0], py + t * dy - p[1])
+            tangent_B = False
+        elif g is not None:
+            # Side B touches b at its midpoint
+            q = vertex(b)
+            side_B = g, (q[0] - g[0], q[1] - g[1])
+            tangent_A = False
+            tangent_B = True
+        else:
+            continue
+
+        vertex_A = intersection(*(side_B + side_C))
+        vertex_B = intersection(*(side_A + side_C))
+        vertex_C = intersection(*(side_A + side_B))
+        if None in (vertex_A, vertex_B, vertex_C):
+            continue
+
+        # The triangle is a local minimum if the midpoint of each side touches
+        # the polygon
+        mid_A = midpoint(vertex_B, vertex_C)
+        mid_B = midpoint(vertex_A, vertex_C)
+        if not (onSide(midpoint(vertex_A, vertex_B), c)
+                and (atVertex(mid_A, a - 1) if tangent_A else onSide(mid_A, a))
+                and (atVertex(mid_B, b) if tangent_B else onSide(mid_B, b))):
+            continue
+
+        (ax, ay), (bx, by), (cx, cy) = vertex_A, vertex_B, vertex_C
+        area = abs((bx - ax) * (cy - ay) - (by - ay) * (cx - ax)) / 2.0
+        if best is None or area < best_area:
+            best, best_area = (vertex_A, vertex_B, vertex_C), area
+
+    # Some side of the minimal triangle is flush with the polygon, and the
+    # search above finds it from that side
+    if best is None:
+        raise ValueError("No enclosing triangle found.")
+    return np.array(best, dtype=np.float64)
 
-        def h(point, side):
-            """Return the distance from 'point' to 'side'."""
-            if type(point) == Point:
-                return side.distance(point)
-            elif isinstance(point, int):
-                return side.distance(points[point])
-
-        def gamma(point, on, base):
-            """Calculate the point on 'on' that is twice as far from 'base' as 'point'."""
-            intersection = on.intersection(base)
-            dist = 2 * h(point, base)
-            # Calculate differential change in distance
-            if on.vertical:
-                ddist = h(Point(intersection.x, intersection.y + 1), base)
-                guess = Point(intersection.x, intersection.y + dist / ddist)
-                if ccw(base.p1, base.p2, guess) != ccw(base.p1, base.p2, point):
-                    guess = Point(intersection.x,
-                                  intersection.y - dist / ddist)
-                return guess
-            else:
-                ddist = h(on.atX(intersection.x + 1), base)
-                guess = on.atX(intersection.x + dist / ddist)
-                if ccw(base.p1, base.p2, guess) != ccw(base.p1, base.p2, point):
-                    guess = on.atX(intersection.x - dist / ddist)
-                return guess
-
-        def critical(a, b, c, gamma_B):
-            return ccw(gamma_B, points[b], points[(b - 1) % n]) == ccw(gamma_B, points[b], points[(b + 1) % n])
-
-        def high(a, b, c, gamma_B):
-            # Test if two adjacent vertices are on same side of line (implies
-            # tangency)
-            if ccw(gamma_B, points[b], points[(b - 1) % n]) == ccw(gamma_B, points[b], points[(b + 1) % n]):
-                return False
-
-            # Test if Gamma and B are on same side of line from adjacent
-            # vertices
-            if ccw(points[(b - 1) % n], points[(b + 1) % n], gamma_B) == ccw(points[(b - 1) % n], points[(b + 1) % n], points[b]):
-                return h(gamma_B, side_C) > h(b, side_C)
-            else:
-                return False
-
-        def low(a, b, c, gamma_B):
-            # Test if two adjacent vertices are on same side of line (implies
-            # tangency)
-            if ccw(gamma_B, points[b], points[(b - 1) % n]) == ccw(gamma_B, points[b], points[(b + 1) % n]):
-                return False
-
-            # Test if Gamma and B are on same side of line from adjacent
-            # vertices
-            if ccw(points[(b - 1) % n], points[(b + 1) % n], gamma_B) == ccw(points[(b - 1) % n], points[(b + 1) % n], points[b]):
-                return False
-            else:
-                return h(gamma_B, side_C) > h(b, side_C)
-
-        def onLeftChain(b):
-            return h((b + 1) % n, side_C) >= h(b, side_C)
 
-        def incrementLowHigh(a, b, c):
-            gamma_A = gamma(points[a], side(a), side_C)
+def minTriangle(poly):
+    """
+        Returns the triangle of minimum area enclosing a convex polygon.
+        Runs in Theta(n) time for convex polygons, or O(n*log(n)) for
+        concave polygons as convex hull must be computed.
 
-            if high(a, b, c, gamma_A):
-                b = (b + 1) % n
-            else:
-                a = (a + 1) % n
-            return a, b
+        Arguments:
+        poly -- the polygon to be enclosed
 
-        def tangency(a, b):
-            gamma_B = gamma(points[b], side(a), side_C)
-            return h(b, side_C) >= h((a - 1) % n, side_C) and high(a, b, c, gamma_B)
+        Returns: the triangle of minimum area enclosing polygon
+    """
+    if not poly.isConvex():
+        poly = convexHull(poly.points)
 
-        # Increment b while low
-        while onLeftChain(b):
-            b = (b + 1) % n
+    # Check for degenerate cases
+    if poly.n < 3:
+        raise ValueError("Polygon must have at least three vertices.")
+    elif poly.n == 3:
+        return Triangle(poly.points[0], poly.points[1], poly.points[2])
 
-        # Increment a if low, b if high
-        while h(b, side_C) > h(a, side_C):
-            a, b = incrementLowHigh(a, b, c)
+    xy = enclosingTriangle([(p.x, p.y) for p in poly.points])
+    return Triangle(*[Point(x, y) for x, y in xy.tolist()])
 
-        # Search for b tangency
-        while tangency(a, b):
-            b = (b + 1) % n
 
-        gamma_B = gamma(points[b], side(a), side_C)
-        # Adjust if necessary
-        if low(a, b, c, gamma_B) or h(b, side_C) < h((a - 1) % n, side_C):
-            side_B = side(b)
-            side_A = side(a)
-            side_B = Line(side_C.intersection(side_B),
-                          side_A.intersection(side_B))
+def _minTriangleOf(xy):
+    """Pool task: the vertices of minTriangle, for a polygon given by its vertices."""
+    triangle = minTriangle(Polygon([Point(x, y) for x, y in xy]))
+    return [(p.x, p.y) for p in triangle.points]
 
-            if h(side_B.midpoint(), side_C) < h((a - 1) % n, side_C):
-                gamma_A = gamma(points[(a - 1) % n], side_B, side_C)
-                side_A = Line(gamma_A, points[(a - 1) % n])
-        else:
-            gamma_B = gamma(points[b], side(a), side_C)
-            side_B = Line(gamma_B, points[b])
-            side_A = Line(gamma_B, points[(a - 1) % n])
-
-        # Calculate final intersections
-        vertex_A = side_C.intersection(side_B)
-        vertex_B = side_C.intersection(side_A)
-        vertex_C = side_A.intersection(side_B)
-
-        # Check if triangle is valid local minimum
-        if not isValidTriangle(vertex_A, vertex_B, vertex_C, a, b, c):
-            triangle = None
-        else:
-            triangle = Triangle(vertex_A, vertex_B, vertex_C)
 
-        return triangle, a, b
+def minTriangles(polygons, workers=None, chunk_size=16):
+    """
+        Returns the minimum enclosing triangle of each polygon (see minTriangle),
+        spreading the polygons across a pool of processes.
 
-    triangles = []
-    a = 1
-    b = 2
-    for i in range(n):
-        triangle, a, b = triangleForIndex(i, a, b)
-        if triangle:
-            triangles.append(triangle)
+        Arguments:
+        polygons -- a list of polygons
+        workers -- the number of processes (default: one per CPU), or 1 to work
+        in this process
+        chunk_size -- the number of polygons handed to a worker at a time
 
-    areas = [triangle.area() for triangle in triangles]
-    return triangles[areas.index(min(areas))]
+        Returns: a list of Triangles, in the order of 'polygons'
+    """
+    if workers == 1:
+        return [minTriangle(poly) for poly in polygons]
+
+    # Only coordinates travel between processes
+    coordinates = [[(float(p.x), float(p.y)) for p in poly.points] for poly in polygons]
+    pool = multiprocessing.Pool(workers)
+    try:
+        results = pool.map(_minTriangleOf, coordinates, chunk_size)
+    finally:
+        pool.close()
+        pool.join()
+    return [Triangle(*[Point(x, y) for x, y in vertices]) for vertices in results]
 
 
 def boundingTriangle(points):
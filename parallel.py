@@ -0,0 +1,63 @@
+import multiprocessing
+
+import numpy as np
+
+from geo import spatial
+from hierarchy import Hierarchy
+
+# The hierarchy each worker process attached to
+_structure = None
+
+
+def _attach(name):
+    global _structure
+    _structure = Hierarchy.attach(name)
+
+
+def _locate(xy):
+    return _structure.regions_of(_structure.locate_many(xy))
+
+
+class WorkerPool(object):
+
+    """
+        A pool of processes attached to one shared copy of a hierarchy. Only point
+        chunks and region ids travel between processes. Use as a context manager,
+        or call close() when done.
+    """
+
+    def __init__(self, structure, workers=None):
+        """
+            Arguments:
+            structure -- the Hierarchy to query
+            workers -- the number of processes (default: one per CPU)
+        """
+        self.name = structure.publish()
+        try:
+            self.pool = multiprocessing.Pool(workers, _attach, (self.name,))
+        except Exception:
+            Hierarchy.unlink(self.name)
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        Hierarchy.unlink(self.name)
+
+    def locate(self, xy, chunk_size=100000):
+        """
+            Locates an (N, 2) array of points, 'chunk_size' points per task.
+
+            Returns: an (N,) array of region indices (-1 outside), in input order
+        """
+        xy = spatial.toArray(xy)
+        chunks = [xy[i:i + chunk_size] for i in range(0, len(xy), chunk_size)]
+        if not chunks:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(self.pool.map(_locate, chunks, 1))
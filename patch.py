@@ -0,0 +1,170 @@
+import numpy as np
+
+from geo import spatial
+from trapezoid import TrapezoidalMap
+
+
+class PatchedRegions(object):
+
+    """
+        A read-only view of a structure's regions with some indices overridden by
+        a replacement region, or by None once removed.
+    """
+
+    def __init__(self, base, overrides):
+        self.base = base
+        self.overrides = overrides
+        self.count = max([len(base)] + [i + 1 for i in overrides])
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError("region index out of range")
+        if i in self.overrides:
+            return self.overrides[i]
+        return self.base[i]
+
+
+class PatchedLeaves(object):
+
+    """
+        A read-only view of a structure's leaf-to-region map followed by the
+        patch's, whose leaves are numbered from 'offset'.
+    """
+
+    def __init__(self, base, patch, offset):
+        self.base = base
+        self.patch = patch
+        self.offset = offset
+
+    def __len__(self):
+        return self.offset + len(self.patch)
+
+    def __getitem__(self, i):
+        if i < self.offset:
+            return self.base[i]
+        return self.patch[i - self.offset]
+
+
+class PatchedStructure(object):
+
+    """
+        A search structure with some of its regions replaced, answering queries
+        through the same interface as Hierarchy. Points landing in a replaced
+        region of the base structure (or outside every region) are located again
+        in a trapezoidal map of the replacements alone. The base's arrays are
+        shared rather than copied, so that building one costs as much as the
+        replacements made since the base was built (O(k log k) for k of them),
+        whatever the size of the map. The leaves of the patch are numbered after
+        those of the base structure.
+    """
+
+    def __init__(self, base, overrides):
+        """
+            Arguments:
+            base -- the structure being patched (a Hierarchy or TrapezoidalMap)
+            overrides -- a map from region indices to their replacement, or None for
+            removed regions; indices past the base's regions add new ones
+        """
+        self.base = base
+        self.overrides = overrides
+        self.regions = PatchedRegions(base.regions, overrides)
+
+        # The base's regions that were replaced, as a set for single queries
+        # and a sorted array for batches
+        self.replaced = frozenset(i for i in overrides if i < len(base.regions))
+        self.replaced_ids = np.array(sorted(self.replaced), dtype=np.int64)
+
+        ids = np.array(sorted(i for i, region in overrides.items()
+                              if region is not None), dtype=np.int64)
+        self.offset = len(base.leaves)
+        if len(ids):
+            self.patch = TrapezoidalMap([overrides[i] for i in ids.tolist()])
+            self.patch_leaves = np.where(self.patch.leaves >= 0,
+                                         ids[self.patch.leaves], -1)
+        else:
+            self.patch = None
+            self.patch_leaves = np.zeros(0, dtype=np.int64)
+        self.patch_leaves.setflags(write=False)
+        self.leaves = PatchedLeaves(base.leaves, self.patch_leaves, self.offset)
+
+    def __len__(self):
+        return len(self.base) + (len(self.patch) if self.patch else 0)
+
+    def depth(self):
+        return self.base.depth() + (self.patch.depth() if self.patch else 0)
+
+    def polygon(self, i):
+        if i < self.offset:
+            return self.base.polygon(i)
+        return self.patch.polygon(i - self.offset)
+
+    def trace(self, x, y):
+        """
+            Locates (x, y) like locate, also counting the work done.
+
+            Returns: the leaf (or -1), the number of levels descended, and the
+            number of children tested
+        """
+        leaf, levels, tested = self.base.trace(x, y)
+        region_id = self.base.leaves[leaf] if leaf >= 0 else -1
+        stale = region_id in self.replaced
+        if self.patch is not None and (stale or region_id < 0):
+            found, more_levels, more_tested = self.patch.trace(x, y)
+            levels += more_levels
+            tested += more_tested
+            if found >= 0 and self.patch.leaves[found] >= 0:
+                return self.offset + found, levels, tested
+        if stale:
+            # A replaced region's area, no longer covered
+            return -1, levels, tested
+        return leaf, levels, tested
+
+    def locate(self, x, y):
+        """Returns the leaf containing (x, y), or -1 if there is none."""
+        return self.trace(x, y)[0]
+
+    def locate_many(self, xy, trace=False):
+        """
+            Locates an (N, 2) array of points in the base structure, then those
+            needing it in the patch.
+
+            Returns: the same as Hierarchy.locate_many
+        """
+        xy = spatial.toArray(xy)
+        if trace:
+            leaf, levels, tested = self.base.locate_many(xy, trace=True)
+        else:
+            leaf = self.base.locate_many(xy)
+
+        region_id = np.where(leaf >= 0, self.base.leaves[leaf], -1)
+        stale = np.in1d(region_id, self.replaced_ids)
+        if self.patch is not None:
+            pending = np.flatnonzero(stale | (region_id < 0))
+            if trace:
+                found, more_levels, more_tested = self.patch.locate_many(
+                    xy[pending], trace=True)
+                levels[pending] += more_levels
+                tested[pending] += more_tested
+            else:
+                found = self.patch.locate_many(xy[pending])
+            hit = found >= 0
+            hit[hit] = self.patch.leaves[found[hit]] >= 0
+            leaf[pending[hit]] = self.offset + found[hit]
+            stale[pending[hit]] = False
+        leaf[stale] = -1
+
+        if trace:
+            return leaf, levels, tested
+        return leaf
+
+    def regions_of(self, leaf):
+        """Maps an array of leaves (as returned by locate_many) to region indices."""
+        patched = leaf >= self.offset
+        region_id = np.where(leaf >= 0, self.base.leaves[np.where(patched, 0, leaf)], -1)
+        region_id[patched] = self.patch_leaves[leaf[patched] - self.offset]
+        return region_id
@@ -0,0 +1,196 @@
+"""Serves point location queries over TCP or a Unix socket, one "x y" per line."""
+from __future__ import print_function
+
+import argparse
+from collections import deque
+
+import numpy as np
+
+try:
+    import asyncio
+except ImportError:
+    try:
+        import trollius as asyncio
+    except ImportError:
+        asyncio = None
+
+# The default size and delay bounds of a micro-batch
+MAX_BATCH = 1024
+MAX_DELAY = 0.002
+
+
+class LocatorService(object):
+
+    """
+        An asyncio front end to a Locator that coalesces concurrent requests into
+        micro-batches: each locate call queues its point and returns a future, and
+        once max_batch points are queued, or max_delay seconds after the first,
+        the batch runs through Locator.locate_many in an executor, off the event
+        loop, resolving every future with its region's index (or -1).
+
+        Written against futures and callbacks, so that it runs on asyncio and on
+        its Python 2 backport, trollius.
+    """
+
+    def __init__(self, locator, max_batch=MAX_BATCH, max_delay=MAX_DELAY,
+                 executor=None, loop=None):
+        """
+            Arguments:
+            locator -- the Locator to query
+            max_batch -- the most points per batch
+            max_delay -- the most seconds a point waits for its batch to fill
+            executor -- where batches run (default: the loop's default executor)
+            loop -- the event loop (default: the current one)
+        """
+        if asyncio is None:
+            raise ImportError("LocatorService requires asyncio (or trollius).")
+        self.locator = locator
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.executor = executor
+        self.loop = loop or asyncio.get_event_loop()
+        self.pending = []
+        self.timer = None
+        self.requests = 0
+        self.batches = 0
+
+    def future(self):
+        if hasattr(self.loop, 'create_future'):
+            return self.loop.create_future()
+        return asyncio.Future(loop=self.loop)
+
+    def locate(self, x, y):
+        """Returns a future of the index of the region containing (x, y), or -1."""
+        future = self.future()
+        self.pending.append((x, y, future))
+        self.requests += 1
+        if len(self.pending) >= self.max_batch:
+            self.flush()
+        elif self.timer is None:
+            self.timer = self.loop.call_later(self.max_delay, self.flush)
+        return future
+
+    def flush(self):
+        """Sends the queued points off as a batch."""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+
+        self.batches += 1
+        xy = np.array([(x, y) for x, y, future in batch], dtype=np.float64)
+        work = self.loop.run_in_executor(self.executor, self.locator.locate_many, xy)
+        work.add_done_callback(lambda done: self.resolve(batch, done))
+
+    def resolve(self, batch, done):
+        futures = [future for x, y, future in batch]
+        if done.cancelled():
+            for future in futures:
+                future.cancel()
+            return
+        error = done.exception()
+        if error is not None:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        for future, region_id in zip(futures, done.result().tolist()):
+            # Callers may have given up on (cancelled) their request
+            if not future.done():
+                future.set_result(region_id)
+
+
+class LocateProtocol(asyncio.Protocol if asyncio else object):
+
+    """
+        A line protocol over a LocatorService: each request is a line holding x
+        and y (separated by whitespace or a comma), answered by a line holding the
+        index of their region (-1 if outside every region), or "error" if the line
+        could not be parsed. Answers come back in the order of the requests.
+    """
+
+    def __init__(self, service):
+        self.service = service
+        self.transport = None
+        self.buffer = b''
+        self.waiting = deque()
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def connection_lost(self, error):
+        self.transport = None
+
+    def data_received(self, data):
+        lines = (self.buffer + data).split(b'\n')
+        self.buffer = lines.pop()
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                x, y = [float(v) for v in line.replace(b',', b' ').split()]
+                future = self.service.locate(x, y)
+            except ValueError as error:
+                future = self.service.future()
+                future.set_exception(error)
+            self.waiting.append(future)
+            future.add_done_callback(self.respond)
+
+    def respond(self, future):
+        while self.waiting and self.waiting[0].done():
+            future = self.waiting.popleft()
+            if future.cancelled() or future.exception() is not None:
+                answer = b'error'
+            else:
+                answer = str(future.result()).encode('ascii')
+            if self.transport is not None:
+                self.transport.write(answer + b'\n')
+
+
+def serve(service, host='127.0.0.1', port=0, path=None):
+    """
+        Starts serving a LocatorService over TCP on (host, port), or on the Unix
+        socket at 'path'.
+
+        Returns: an awaitable of the asyncio Server
+    """
+    factory = lambda: LocateProtocol(service)
+    if path:
+        return service.loop.create_unix_server(factory, path)
+    return service.loop.create_server(factory, host, port)
+
+
+def main(argv=None):
+    from kirkpatrick import Locator
+
+    parser = argparse.ArgumentParser(prog='python service.py', description=__doc__)
+    parser.add_argument('index', help='an index saved by Locator.save')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', metavar='PATH', help='serve on a Unix socket')
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH)
+    parser.add_argument('--max-delay', type=float, default=MAX_DELAY,
+                        help='seconds a request may wait for its batch')
+    parser.add_argument('--grid', type=int, metavar='RESOLUTION',
+                        help='index the hierarchy with a grid first')
+    args = parser.parse_args(argv)
+
+    locator = Locator.load(args.index)
+    if args.grid:
+        locator.build_grid(args.grid)
+    service = LocatorService(locator, args.max_batch, args.max_delay)
+    server = service.loop.run_until_complete(
+        serve(service, args.host, args.port, args.unix))
+    print('Serving on', args.unix or '%s:%d' % server.sockets[0].getsockname()[:2])
+    try:
+        service.loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    main()
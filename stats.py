@@ -0,0 +1,84 @@
+from collections import Counter
+import threading
+
+import numpy as np
+
+
+def percentiles(samples):
+    """Returns the mean, median and 99th percentile of a sequence of samples."""
+    samples = np.asarray(samples, dtype=np.float64)
+    return {
+        'mean': float(samples.mean()),
+        'p50': float(np.percentile(samples, 50)),
+        'p99': float(np.percentile(samples, 99)),
+    }
+
+
+class QueryStats(object):
+
+    """
+        Histograms of the work done by point location queries: the number of
+        levels descended, children tested, and containment tests (the children
+        plus the initial test against the root) per query. Safe to share between
+        threads; the callback runs outside the lock.
+    """
+
+    def __init__(self, callback=None):
+        """
+            Arguments:
+            callback -- called as callback(levels, children, contains) after every
+            query, with ints for single queries and (N,) arrays for batches
+        """
+        self.callback = callback
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.queries = 0
+            self.levels = Counter()
+            self.children = Counter()
+            self.contains = Counter()
+
+    def record(self, levels, children):
+        """Records a single query."""
+        with self.lock:
+            self.queries += 1
+            self.levels[levels] += 1
+            self.children[children] += 1
+            self.contains[children + 1] += 1
+        if self.callback:
+            self.callback(levels, children, children + 1)
+
+    def record_many(self, levels, children):
+        """Records a batch of queries, given their per-query counts as arrays."""
+        with self.lock:
+            self.queries += len(levels)
+            for histogram, counts in ((self.levels, levels),
+                                      (self.children, children),
+                                      (self.contains, children + 1)):
+                bins = np.bincount(counts)
+                for value in np.flatnonzero(bins).tolist():
+                    histogram[value] += int(bins[value])
+        if self.callback:
+            self.callback(levels, children, children + 1)
+
+    def summary(self):
+        """Returns the mean and maximum of each histogram, along with the histograms."""
+        def describe(histogram):
+            total = sum(histogram.values())
+            if not total:
+                return {'mean': 0.0, 'max': 0, 'histogram': {}}
+            return {
+                'mean': sum(k * v for k, v in histogram.items()) / float(total),
+                'max': max(histogram),
+                'histogram': dict(histogram),
+            }
+
+        with self.lock:
+            return {
+                'queries': self.queries,
+                'levels': describe(self.levels),
+                'children': describe(self.children),
+                'contains': describe(self.contains),
+            }
@@ -0,0 +1,137 @@
+import os
+from itertools import chain, islice
+
+import numpy as np
+
+# Extensions read (and written) as text; anything else is raw binary
+TEXT_EXTENSIONS = ('.csv', '.txt', '.tsv')
+
+
+# Column separators of text files, by extension (default: a comma)
+DELIMITERS = {'.tsv': '\t'}
+
+
+def guess_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    return 'csv' if extension in TEXT_EXTENSIONS else 'binary'
+
+
+def guess_delimiter(path):
+    return DELIMITERS.get(os.path.splitext(path)[1].lower(), ',')
+
+
+def read_binary(f, batch_size):
+    """Yields (N, 2) arrays of the little-endian float64 pairs in the file f."""
+    while True:
+        data = np.fromfile(f, dtype='<f8', count=2 * batch_size)
+        if not len(data):
+            return
+        if len(data) % 2:
+            raise ValueError("Binary input must hold an even number of floats.")
+        yield data.reshape(-1, 2).astype(np.float64)
+
+
+def read_csv(f, batch_size, delimiter=','):
+    """
+        Yields (N, 2) arrays of the first two columns of the lines of f. A first
+        line that does not start with a number is taken to be a header.
+    """
+    rows = (line.strip() for line in f)
+    rows = (line for line in rows if line)
+    first = next(rows, None)
+    if first is None:
+        return
+    try:
+        float(first.split(delimiter)[0])
+        rows = chain([first], rows)
+    except ValueError:
+        pass
+
+    while True:
+        lines = list(islice(rows, batch_size))
+        if not lines:
+            return
+        text = delimiter.join(delimiter.join(line.split(delimiter, 2)[:2])
+                              for line in lines)
+        data = np.fromstring(text, dtype=np.float64, sep=delimiter)
+        if len(data) != 2 * len(lines):
+            raise ValueError("Malformed CSV input.")
+        yield data.reshape(-1, 2)
+
+
+def read_iterable(points, batch_size):
+    """Yields (N, 2) arrays from an iterable of Points or (x, y) pairs."""
+    points = iter(points)
+    while True:
+        batch = [(p.x, p.y) if hasattr(p, 'x') else p
+                 for p in islice(points, batch_size)]
+        if not batch:
+            return
+        yield np.array(batch, dtype=np.float64).reshape(-1, 2)
+
+
+def read_points(source, batch_size, format=None):
+    """
+        Lazily reads points in batches.
+
+        Arguments:
+        source -- a path, an open file, or an iterable of Points or (x, y) pairs
+        batch_size -- the most points per batch
+        format -- 'csv' or 'binary' (raw little-endian float64 pairs) for paths
+        and files (default: guessed from the extension, see TEXT_EXTENSIONS);
+        text columns are separated by tabs in .tsv files, commas otherwise
+
+        Returns: a generator of (N, 2) float64 arrays
+    """
+    if isinstance(source, basestring):
+        return read_path(source, batch_size, format or guess_format(source),
+                         guess_delimiter(source))
+    if hasattr(source, 'read'):
+        name = getattr(source, 'name', '')
+        name = name if isinstance(name, basestring) else ''
+        format = format or guess_format(name)
+        if format == 'csv':
+            return read_csv(source, batch_size, guess_delimiter(name))
+        return read_binary(source, batch_size)
+    return read_iterable(source, batch_size)
+
+
+def read_path(path, batch_size, format, delimiter=','):
+    if format == 'csv':
+        with open(path, 'r') as f:
+            for batch in read_csv(f, batch_size, delimiter):
+                yield batch
+    else:
+        with open(path, 'rb') as f:
+            for batch in read_binary(f, batch_size):
+                yield batch
+
+
+def locate_batches(locator, source, batch_size, format=None):
+    """Yields the region ids of each batch of points read from source."""
+    for xy in read_points(source, batch_size, format):
+        yield locator.locate_many(xy)
+
+
+def write_ids(batches, output, format=None):
+    """
+        Writes arrays of region ids to output (a path or an open file), one per
+        line for text formats, or as little-endian int64 otherwise.
+
+        Returns: the number of ids written
+    """
+    if isinstance(output, basestring):
+        format = format or guess_format(output)
+        with open(output, 'w' if format == 'csv' else 'wb') as f:
+            return write_ids(batches, f, format)
+
+    name = getattr(output, 'name', '')
+    format = format or guess_format(name if isinstance(name, basestring) else '')
+    count = 0
+    for ids in batches:
+        if format == 'csv':
+            output.write(''.join('%d\n' % i for i in ids.tolist()))
+        else:
+            output.write(ids.astype('<i8').tobytes())
+        count += len(ids)
+    return count
@@ -1,12 +1,26 @@
+import json
+import multiprocessing
+import operator
+import os
+import pickle
+import socket
+import sys
+import tempfile
+import threading
 import unittest
+from multiprocessing.pool import ThreadPool
 from random import random
-from geo.shapes import Point, Polygon, Triangle
+import numpy as np
+from geo import predicates
+from geo.shapes import Point, Polygon, Triangle, ccw, orientation
 from geo.spatial import triangulatePolygon
 from geo.generator import randomConvexPolygon, randomConcaveTiling
 from geo.drawer import plot, plotPoints, show, showPoints
-from min_triangle import minTriangle, boundingTriangle
-from graph import DirectedGraph, UndirectedGraph
+from min_triangle import minTriangle, minTriangles, boundingTriangle
+from graph import DirectedGraph, UndirectedGraph, min_degree_order
 from kirkpatrick import Locator
+import cli
+import service
 
 
 class TestGeo(unittest.TestCase):
@@ -22,6 +36,33 @@ class TestGeo(unittest.TestCase):
         for point in points:
             self.assertTrue(poly.contains(point))
 
+    def testCachedGeometry(self):
+        poly = randomConvexPolygon(100, k=50)
+        self.assertTrue(poly.triangulation() is poly.triangulation())
+        min_x, min_y, max_x, max_y = poly.bbox()
+        self.assertTrue(not poly.contains(Point(max_x + 1, min_y)))
+
+        # A square with a notch cut into its top
+        concave = Polygon([Point(0, 0), Point(4, 0), Point(4, 4), Point(2, 1),
+                           Point(0, 4)])
+        self.assertTrue(not concave.isConvex())
+        # The vertices cannot be edited under the cached data
+        self.assertRaises(TypeError, operator.setitem, concave.points, 3, Point(2, 3))
+        self.assertTrue(concave.triangulation() is concave.triangulation())
+        point = concave.smartInteriorPoint()
+        self.assertTrue(concave.contains(point))
+        self.assertTrue(concave.contains(point))
+
+    def testPoint(self):
+        p = Point(1.5, -2)
+        self.assertRaises(AttributeError, setattr, p, 'x', 0)
+        self.assertRaises(AttributeError, setattr, p, 'z', 0)
+        self.assertTrue(not hasattr(p, '__dict__'))
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            q = pickle.loads(pickle.dumps(p, protocol))
+            self.assertEqual(q, p)
+            self.assertEqual(hash(q), hash(p))
+
     def testConvex(self):
         n = 100
         poly = randomConvexPolygon(n, k=50)
@@ -59,6 +100,26 @@ class TestGeo(unittest.TestCase):
             plot(poly)
             showPoints(points, style='ro')
 
+    def testOrientation(self):
+        # Points within a few ulps of the line through (12, 12) and (24, 24),
+        # where the floating-point determinant gets signs wrong
+        u = 2.0 ** -53
+        grid = [(0.5 + i * u, 0.5 + j * u) for i in range(16) for j in range(16)]
+        exact = [predicates.orientExact(x, y, 12.0, 12.0, 24.0, 24.0) for x, y in grid]
+        self.assertEqual(set(exact), set([-1, 0, 1]))
+        self.assertEqual([predicates.orient(x, y, 12.0, 12.0, 24.0, 24.0)
+                          for x, y in grid], exact)
+        xy = np.array(grid)
+        signs = np.sign(predicates.orientMany(xy[:, 0], xy[:, 1], 12.0, 12.0,
+                                              24.0, 24.0))
+        self.assertEqual(signs.tolist(), exact)
+        # Scalars too, Python or NumPy
+        self.assertEqual([np.sign(predicates.orientMany(np.float64(x), y, 12.0, 12.0,
+                                                        24.0, 24.0))
+                          for x, y in grid], exact)
+        self.assertEqual([ccw(Point(x, y), Point(12.0, 12.0), Point(24.0, 24.0))
+                          for x, y in grid], [s > 0 for s in exact])
+
     def testTriangleInside(self):
         A = Point(1, 1)
         B = Point(3, 1)
@@ -89,6 +150,40 @@ class TestGeo(unittest.TestCase):
 
         show(list(polygons))
 
+    def testMinTriangles(self):
+        square = Polygon([Point(0, 0), Point(1, 0), Point(1, 1), Point(0, 1)])
+        self.assertAlmostEqual(minTriangle(square).area(), 2.0)
+
+        # A regular hexagon's is the triangle extending every other side
+        angles = np.arange(6) * np.pi / 3
+        hexagon = Polygon([Point(x, y) for x, y in zip(np.cos(angles), np.sin(angles))])
+        self.assertAlmostEqual(minTriangle(hexagon).area(), 1.5 * 3 * np.sqrt(3) / 2)
+
+        # Orientation, repeated and collinear vertices and scale don't matter
+        tiny = Polygon([Point(0, 0), Point(0, 1e-5), Point(1e-5, 1e-5),
+                        Point(1e-5, 1e-5), Point(1e-5, 5e-6), Point(1e-5, 0)])
+        self.assertAlmostEqual(minTriangle(tiny).area() / 2e-10, 1.0, places=5)
+
+        polygons = []
+        for n in (5, 8, 13, 40, 200):
+            angles = np.linspace(0, 2 * np.pi, n, endpoint=False) + 0.1 * n
+            polygons.append(Polygon([Point(x, y) for x, y in
+                                     zip(3 * np.cos(angles), np.sin(angles))]))
+        triangles = minTriangles(polygons, workers=2)
+        self.assertEqual(len(triangles), len(polygons))
+        for poly, triangle in zip(polygons, triangles):
+            expected = minTriangle(poly)
+            self.assertEqual([(p.x, p.y) for p in triangle.points],
+                             [(p.x, p.y) for p in expected.points])
+
+            # Every vertex lies inside, up to rounding
+            (ax, ay), (bx, by), (cx, cy) = [(p.x, p.y) for p in triangle.points]
+            xy = np.array([(p.x, p.y) for p in poly.points])
+            sign = np.sign((bx - ax) * (cy - ay) - (by - ay) * (cx - ax))
+            for (ux, uy), (vx, vy) in (((ax, ay), (bx, by)), ((bx, by), (cx, cy)), ((cx, cy), (ax, ay))):
+                cross = (vx - ux) * (xy[:, 1] - uy) - (vy - uy) * (xy[:, 0] - ux)
+                self.assertTrue((sign * cross >= -1e-9).all())
+
     @unittest.skipIf(not ANIMATE, "No animations")
     def testMinTriangle(self):
         points = randomConvexPolygon(10, k=20).points
@@ -103,30 +198,46 @@ class TestGeo(unittest.TestCase):
         show(exterior, style='bo-')
 
 
+def locateInWorker(name, xy, queue):
+    queue.put(list(Locator.attach(name).locate_many(xy)))
+
+
 class TestLocator(unittest.TestCase):
     ANIMATE = False
 
-    def runLocator(self, regions):
+    def runLocator(self, regions, **options):
         # Pre-process regions
-        l = Locator(regions)
+        l = Locator(regions, **options)
 
-        if self.ANIMATE:
+        if self.ANIMATE and l.boundary:
             show(regions)
             plot(l.boundary, style='g--')
             show(regions)
 
         # Ensure resulting DAG is acyclic
-        self.assertTrue(l.dag.acyclic())
+        if l.dag is not None:
+            self.assertTrue(l.dag.acyclic())
+
+        # Every region must be reachable in the compiled hierarchy
+        leaves = set(l.structure.leaves.tolist())
+        self.assertTrue(leaves.issuperset(range(len(regions))))
 
         n = 50
         # Ensure correctness
-        for region in regions:
+        for region_id, region in enumerate(regions):
             # Test n random interior points per region
+            targets = []
             for k in range(n):
                 target = region.smartInteriorPoint()
                 target_region = l.locate(target)
                 self.assertEqual(region, target_region)
                 self.assertTrue(target_region.contains(target))
+                self.assertEqual(l.locate(target, as_id=True), region_id)
+                targets.append(target.np())
+
+            # Batch location must agree
+            ids = l.locate_many(targets)
+            self.assertEqual(list(ids), [region_id] * n)
 
             # Animate one interior point
             if self.ANIMATE:
@@ -144,6 +255,9 @@ class TestLocator(unittest.TestCase):
                 if not is_valid:
                     for region in regions:
                         self.assertTrue(not region.contains(target))
+                    self.assertEqual(l.locate_many([target.np()])[0], -1)
+                    self.assertEqual(l.annotatedLocate(target, as_id=True),
+                                     (-1, False))
 
             # Animate one exterior point
             if self.ANIMATE and not is_valid and target_region:
@@ -151,6 +265,251 @@ class TestLocator(unittest.TestCase):
                 plot(target_region, style='ro--')
                 showPoints(target, style='bx')
 
+    def testSaveLoad(self):
+        poly = randomConvexPolygon(50)
+        regions = triangulatePolygon(poly)
+        l = Locator(regions)
+
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            l.save(path)
+            loaded = Locator.load(path)
+            xy = np.random.random((1000, 2))
+            self.assertEqual(list(loaded.locate_many(xy)), list(l.locate_many(xy)))
+
+            for region_id, region in enumerate(regions):
+                target = region.smartInteriorPoint()
+                self.assertEqual(loaded.locate(target, as_id=True), region_id)
+                self.assertEqual([p.np() for p in loaded.locate(target).points],
+                                 [p.np() for p in region.points])
+        finally:
+            os.remove(path)
+
+    def testLocateStream(self):
+        poly = randomConvexPolygon(50)
+        l = Locator(triangulatePolygon(poly))
+        xy = np.random.uniform(-10, 110, (1000, 2))
+        expected = l.locate_many(xy).tolist()
+
+        directory = tempfile.mkdtemp()
+        try:
+            binary = os.path.join(directory, 'points.bin')
+            xy.astype('<f8').tofile(binary)
+            text = os.path.join(directory, 'points.csv')
+            with open(text, 'w') as f:
+                f.write('x,y,label\n')
+                f.write(''.join('%r,%r,a\n' % (x, y) for x, y in xy.tolist()))
+            tabs = os.path.join(directory, 'points.tsv')
+            with open(tabs, 'w') as f:
+                f.write(''.join('%r\t%r\n' % (x, y) for x, y in xy.tolist()))
+
+            for source in (binary, text, tabs, unicode(binary), unicode(text),
+                           xy.tolist(), iter([Point(x, y) for x, y in xy])):
+                batches = list(l.locate_stream(source, batch_size=300))
+                self.assertEqual([len(ids) for ids in batches], [300, 300, 300, 100])
+                self.assertEqual(np.concatenate(batches).tolist(), expected)
+
+            output = os.path.join(directory, 'ids.bin')
+            self.assertEqual(l.locate_stream(text, batch_size=300, output=output), 1000)
+            self.assertEqual(np.fromfile(output, dtype='<i8').tolist(), expected)
+            output = unicode(os.path.join(directory, 'ids.csv'))
+            l.locate_stream(binary, output=output)
+            self.assertEqual(np.loadtxt(output, dtype=np.int64).tolist(), expected)
+        finally:
+            for name in os.listdir(directory):
+                os.remove(os.path.join(directory, name))
+            os.rmdir(directory)
+
+    def testCommandLine(self):
+        triangles = triangulatePolygon(randomConvexPolygon(20))
+        rings = [[[float(p.x), float(p.y)] for p in t.points + t.points[:1]]
+                 for t in triangles]
+        geojson = {'type': 'FeatureCollection', 'features': [
+            {'type': 'Feature', 'properties': {},
+             'geometry': {'type': 'Polygon', 'coordinates': [ring]}}
+            for ring in rings]}
+        wkt = ''.join('POLYGON ((%s))\n' % ', '.join('%r %r' % tuple(p) for p in ring)
+                      for ring in rings)
+        xy = np.random.uniform(-1, 11, (500, 2))
+        expected = Locator(triangles).locate_many(xy)
+
+        directory = tempfile.mkdtemp()
+        stdout = sys.stdout
+        try:
+            paths = dict((name, os.path.join(directory, name)) for name in
+                         ('regions.geojson', 'regions.wkt', 'index', 'points.bin',
+                          'ids.bin'))
+            with open(paths['regions.geojson'], 'w') as f:
+                json.dump(geojson, f)
+            with open(paths['regions.wkt'], 'w') as f:
+                f.write(wkt)
+            xy.tofile(paths['points.bin'])
+
+            regions = cli.read_regions(paths['regions.wkt'])
+            self.assertEqual([r.points for r in regions],
+                             [r.points for r in cli.read_regions(paths['regions.geojson'])])
+            self.assertEqual([r.points for r in regions],
+                             [t.points for t in triangles])
+
+            sys.stdout = open(os.devnull, 'w')
+            report = cli.main(['build', paths['regions.geojson'], paths['index']])
+            self.assertEqual(report['regions'], len(triangles))
+            report = cli.main(['query', paths['index'], paths['points.bin'],
+                               '--batch-size', '200', '-o', paths['ids.bin']])
+            self.assertEqual((report['points'], report['outside']),
+                             (500, (expected < 0).sum()))
+            ids = np.fromfile(paths['ids.bin'], dtype='<i8')
+            self.assertEqual(ids.tolist(), expected.tolist())
+
+            # Three unit squares tiling an L
+            squares = ''.join('POLYGON ((%d %d, %d %d, %d %d, %d %d))\n' %
+                              (x, y, x + 1, y, x + 1, y + 1, x, y + 1)
+                              for x, y in ((0, 0), (1, 0), (0, 1)))
+            outline = 'POLYGON ((0 0, 1 0, 2 0, 2 1, 1 1, 1 2, 0 2, 0 1))\n'
+            for name, text in (('squares.wkt', squares), ('outline.wkt', outline)):
+                paths[name] = os.path.join(directory, name)
+                with open(paths[name], 'w') as f:
+                    f.write(text)
+            cli.main(['build', paths['squares.wkt'], paths['index'],
+                      '--outline', paths['outline.wkt']])
+            xy = np.array([(0.5, 0.5), (1.75, 0.25), (0.5, 1.5), (1.5, 1.5)])
+            self.assertEqual(Locator.load(paths['index']).locate_many(xy).tolist(),
+                             [0, 1, 2, -1])
+            self.assertRaises(ValueError, cli.main, ['build', paths['squares.wkt'],
+                              paths['index'], '--outline', paths['squares.wkt']])
+        finally:
+            if sys.stdout is not stdout:
+                sys.stdout.close()
+                sys.stdout = stdout
+            for name in os.listdir(directory):
+                os.remove(os.path.join(directory, name))
+            os.rmdir(directory)
+
+    def testService(self):
+        if service.asyncio is None:
+            self.skipTest("asyncio is not available")
+        l = Locator(triangulatePolygon(randomConvexPolygon(50)))
+        xy = np.random.uniform(-10, 110, (500, 2))
+        expected = l.locate_many(xy).tolist()
+
+        loop = service.asyncio.new_event_loop()
+        try:
+            locator = service.LocatorService(l, max_batch=64, max_delay=0.01, loop=loop)
+            futures = [locator.locate(x, y) for x, y in xy.tolist()]
+            self.assertEqual([loop.run_until_complete(f) for f in futures], expected)
+            self.assertEqual((locator.requests, locator.batches), (500, 8))
+
+            # Pipelined requests over TCP, answered in order
+            server = loop.run_until_complete(service.serve(locator, port=0))
+            thread = threading.Thread(target=loop.run_forever)
+            thread.start()
+            try:
+                client = socket.create_connection(server.sockets[0].getsockname()[:2])
+                request = ''.join('%r %r\n' % (x, y) for x, y in xy.tolist())
+                client.sendall((request + 'nonsense\n').encode('ascii'))
+                response = b''
+                while response.count(b'\n') < len(xy) + 1:
+                    response += client.recv(65536)
+                client.close()
+            finally:
+                loop.call_soon_threadsafe(loop.stop)
+                thread.join()
+            server.close()
+            answers = response.decode('ascii').split()
+            self.assertEqual(answers, [str(i) for i in expected] + ['error'])
+        finally:
+            loop.close()
+
+    def testSharedLocator(self):
+        poly = randomConvexPolygon(50)
+        l = Locator(triangulatePolygon(poly))
+        xy = np.random.random((1000, 2))
+
+        name = l.publish()
+        try:
+            queue = multiprocessing.Queue()
+            worker = multiprocessing.Process(target=locateInWorker,
+                                             args=(name, xy, queue))
+            worker.start()
+            self.assertEqual(queue.get(timeout=60), list(l.locate_many(xy)))
+            worker.join()
+
+            attached = Locator.attach(name)
+            self.assertTrue(not attached.structure.vertices.flags.writeable)
+        finally:
+            Locator.unpublish(name)
+
+    def testParallelLocate(self):
+        poly = randomConvexPolygon(50)
+        l = Locator(triangulatePolygon(poly))
+        xy = np.random.random((1000, 2))
+        ids = l.locate_parallel(xy, workers=2, chunk_size=300)
+        self.assertEqual(list(ids), list(l.locate_many(xy)))
+
+    def testConcurrentQueries(self):
+        poly = randomConvexPolygon(50)
+        l = Locator(triangulatePolygon(poly))
+        self.assertTrue(not l.structure.children.flags.writeable)
+        xy = np.random.uniform(-10, 110, (2000, 2))
+        expected = l.locate_many(xy).tolist()
+
+        # A loaded locator builds its region polygons lazily, on first access
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            l.save(path)
+            loaded = Locator.load(path)
+            stats = loaded.enable_stats()
+            loaded.enable_cache(maxsize=500)
+
+            def hammer(seed):
+                order = np.random.RandomState(seed).permutation(len(xy))
+                singles = dict((i, loaded.locate(Point(*xy[i].tolist())))
+                               for i in order[:500].tolist())
+                return singles, loaded.locate_many(xy[order]), order
+
+            pool = ThreadPool(8)
+            try:
+                results = pool.map(hammer, range(16))
+            finally:
+                pool.close()
+                pool.join()
+
+            for singles, ids, order in results:
+                self.assertEqual(ids.tolist(), [expected[i] for i in order.tolist()])
+                for i, region in singles.items():
+                    if expected[i] < 0:
+                        self.assertEqual(region, None)
+                    else:
+                        # Every thread sees the same polygon object
+                        self.assertTrue(region is loaded.regions[expected[i]])
+            self.assertEqual(stats.queries, 16 * (len(xy) + 500) -
+                             loaded.cache.hits)
+        finally:
+            os.remove(path)
+
+    def testQueryStats(self):
+        poly = randomConvexPolygon(50)
+        l = Locator(triangulatePolygon(poly))
+        seen = []
+        stats = l.enable_stats(lambda *counts: seen.append(counts))
+
+        xy = np.random.random((200, 2))
+        for x, y in xy.tolist():
+            l.locate(Point(x, y))
+        self.assertEqual(stats.queries, 200)
+        self.assertEqual(len(seen), 200)
+        single = stats.summary()
+
+        stats.reset()
+        l.locate_many(xy)
+        self.assertEqual(stats.summary(), single)
+
+        l.disable_stats()
+        l.locate_many(xy)
+        self.assertEqual(stats.queries, 200)
+
     def testSimple(self):
         # Create distinct regions
         A = Point(0, 0)
@@ -184,6 +543,285 @@ class TestLocator(unittest.TestCase):
         regions = triangulatePolygon(poly)
         self.runLocator(regions)
 
+    def testArbitraryStrategy(self):
+        poly = randomConvexPolygon(50)
+        regions = triangulatePolygon(poly)
+        self.runLocator(regions, max_degree=6, strategy='arbitrary')
+
+    def testHoleLinks(self):
+        def separated(s, t):
+            # Whether an edge of s has all of t on or beyond it
+            a, b, c = s.points
+            if orientation(a, b, c) < 0:
+                a, c = c, a
+            return any(all(orientation(u, v, w) <= 0 for w in t.points)
+                       for u, v in ((a, b), (b, c), (c, a)))
+
+        def overlap(s, t):
+            return not separated(s, t) and not separated(t, s)
+
+        l = Locator(randomConcaveTiling(randomConvexPolygon(50, k=50)))
+        parents = {}
+        for triangle, children in l.dag.e.items():
+            # Skip the links from the triangles of a polygon to it
+            for child in children:
+                if child.n == 3:
+                    self.assertTrue(overlap(triangle, child))
+                    parents.setdefault(child, set()).add(triangle)
+
+        # Triangles of the star of p are replaced by triangles without p,
+        # and their other vertices remain on the link
+        stars = {}
+        for child, triangles in parents.items():
+            removed = [p for p in child.points
+                       if not any(p in t.points for t in triangles)]
+            self.assertEqual(len(removed), 1)
+            old, new = stars.setdefault(removed[0], (set(), set()))
+            old.add(child)
+            new.update(triangles)
+        self.assertTrue(stars)
+        for old, new in stars.values():
+            for triangle in new:
+                for child in old:
+                    self.assertEqual(overlap(triangle, child),
+                                     child in l.dag.e[triangle])
+
+    def testIncrementalAdjacency(self):
+        locators = []
+
+        class RecordingLocator(Locator):
+            def preprocess(self, regions, outline=None):
+                locators.append(self)
+                Locator.preprocess(self, regions, outline)
+
+        rounds = []
+
+        def check(g, candidates, key):
+            # Each round starts here with the graph the previous rounds left;
+            # the current triangles are the roots of the DAG so far
+            expected = {}
+            for region in locators[0].dag.roots:
+                for u in region.points:
+                    expected.setdefault(u, set()).update(
+                        v for v in region.points if not v == u)
+            self.assertEqual(g.e, expected)
+            rounds.append(len(g.e))
+            return min_degree_order(g, candidates, key)
+
+        regions = randomConcaveTiling(randomConvexPolygon(50, k=50))
+        l = RecordingLocator(regions, strategy=check)
+        self.assertEqual(len(rounds), l.rounds)
+        self.assertTrue(rounds[0] > rounds[-1])
+
+    def testSmallMaxDegree(self):
+        regions = triangulatePolygon(randomConvexPolygon(30))
+        self.assertRaises(ValueError, Locator, regions, max_degree=2)
+
+    def testReplaceRegions(self):
+        regions = triangulatePolygon(randomConvexPolygon(50))
+        l = Locator(list(regions))
+        xy = np.random.uniform(-10, 110, (2000, 2))
+        before = l.locate_many(xy)
+
+        # Merge two adjacent triangles into a quadrilateral
+        edges = {}
+        for j, t in enumerate(regions):
+            for k in range(3):
+                edge = frozenset([t.points[k], t.points[(k + 1) % 3]])
+                if edge in edges:
+                    i = edges[edge]
+                    break
+                edges[edge] = j
+            else:
+                continue
+            break
+        shared = set(regions[i].points) & set(regions[j].points)
+        k = [p in shared for p in regions[i].points].index(False)
+        u, s1, s2 = regions[i].points[k:] + regions[i].points[:k]
+        w = [p for p in regions[j].points if p not in shared][0]
+        quad = Polygon([u, s1, w, s2])
+
+        # Replacements leaving a gap (or covering new ground) are rejected
+        self.assertRaises(ValueError, l.replace_regions, [i, j], [regions[i]])
+        self.assertRaises(ValueError, l.replace_regions, [i], [quad])
+        self.assertTrue(l.structure.regions[j] is regions[j])
+
+        self.assertRaises(TypeError, l.replace_regions, [i, regions[j]], [quad])
+        self.assertEqual(l.replace_regions([i, j], [quad]), [i])
+        self.assertRaises(IndexError, l.replace_regions, [j], [])
+        self.assertTrue(l.regions[i] is quad and l.regions[j] is None)
+        expected = np.where(before == j, i, before)
+        self.assertEqual(l.locate_many(xy).tolist(), expected.tolist())
+        self.assertEqual([l.locate(Point(x, y), as_id=True) for x, y in xy.tolist()],
+                         expected.tolist())
+        self.assertRaises(ValueError, l.save, 'unused')
+
+        # Split it back, appending the halves
+        self.assertEqual(l.replace_regions([i], [regions[i], regions[j]]),
+                         [i, len(regions)])
+        expected = np.where(before == j, len(regions), before)
+        self.assertEqual(l.locate_many(xy).tolist(), expected.tolist())
+
+        # Fold the updates into a fresh hierarchy, keeping indices
+        l.rebuild(background=True).join()
+        self.assertTrue(l.dag.acyclic())
+        self.assertEqual(l.locate_many(xy).tolist(), expected.tolist())
+        self.assertTrue(l.regions[j] is None)
+
+        # Empty slots survive saving and publishing
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            l.save(path)
+            loaded = Locator.load(path)
+            self.assertTrue(loaded.regions[j] is None)
+            self.assertEqual(len(loaded.regions), len(l.regions))
+            self.assertEqual(loaded.locate_many(xy).tolist(), expected.tolist())
+        finally:
+            os.remove(path)
+
+        name = l.publish()
+        try:
+            attached = Locator.attach(name)
+            self.assertTrue(attached.regions[j] is None)
+            self.assertEqual(attached.locate_many(xy).tolist(), expected.tolist())
+        finally:
+            Locator.unpublish(name)
+        self.assertEqual(l.locate_parallel(xy, workers=2).tolist(), expected.tolist())
+
+        # Background failures surface on the next rebuild
+        def fail(graph, candidates, key):
+            raise ValueError("No vertices today.")
+        l.strategy = fail
+        l.rebuild(background=True).join()
+        self.assertRaises(ValueError, l.rebuild)
+        l.strategy = 'min-degree'
+        l.rebuild()
+        self.assertEqual(l.locate_many(xy).tolist(), expected.tolist())
+
+    def testGrid(self):
+        initial = randomConvexPolygon(100, k=100)
+        regions = randomConcaveTiling(initial)
+        self.runLocator(regions, grid=32)
+
+        l = Locator(regions)
+        xy = np.random.uniform(-10, 110, (2000, 2))
+        expected = l.locate_many(xy)
+        grid = l.build_grid(1000, max_cells=500)
+        self.assertTrue(len(grid) <= 500)
+        self.assertEqual(l.locate_many(xy).tolist(), expected.tolist())
+        self.assertEqual([l.locate(Point(x, y), as_id=True) for x, y in xy.tolist()],
+                         expected.tolist())
+
+    def testCache(self):
+        poly = randomConvexPolygon(50)
+        l = Locator(triangulatePolygon(poly))
+        points = [Point(x, y) for x, y in np.random.uniform(-10, 110, (200, 2)).tolist()]
+        expected = [l.locate(p, as_id=True) for p in points]
+
+        cache = l.enable_cache(maxsize=100)
+        for i in range(2):
+            self.assertEqual([l.locate(p, as_id=True) for p in points], expected)
+        self.assertEqual(cache.info(), {'hits': 0, 'misses': 400, 'size': 100,
+                                        'maxsize': 100})
+        for p, region_id in zip(points[-100:], expected[-100:]):
+            self.assertEqual(l.locate(p, as_id=True), region_id)
+        self.assertEqual(cache.hits, 100)
+
+        # Rebuilding empties the cache
+        l.compile()
+        l.locate(points[-1])
+        self.assertEqual((len(cache), cache.misses), (1, 401))
+
+        # Quantized keys share results within a cell
+        cache = l.enable_cache(quantum=1.0)
+        l.locate(Point(50.25, 50.25))
+        l.locate(Point(50.75, 50.5))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def testCursor(self):
+        initial = randomConvexPolygon(100, k=100)
+        regions = randomConcaveTiling(initial)
+        l = Locator(regions)
+
+        # Leaves tile the root: only its own edges lack a neighbor
+        neighbors = l.structure.neighbors()
+        leaves = np.diff(l.structure.offsets) == 0
+        self.assertEqual((neighbors[leaves] < 0).sum(), 3)
+
+        # A random walk across the regions
+        steps = np.random.normal(0, 1, (2000, 2))
+        xy = np.clip(50 + np.cumsum(steps, axis=0), 0.5, 99.5)
+        points = [Point(x, y) for x, y in xy.tolist()]
+        cursor = l.cursor()
+        for p in points:
+            region, valid = cursor.annotatedLocate(p)
+            expected, expected_valid = l.annotatedLocate(p)
+            self.assertEqual(valid, expected_valid)
+            self.assertEqual(region and region.points, expected and expected.points)
+            self.assertEqual(cursor.locate(p, as_id=True), l.locate(p, as_id=True))
+        self.assertTrue(cursor.walks > cursor.descents)
+
+    def testTrapezoidEngine(self):
+        poly = randomConvexPolygon(50)
+        self.runLocator(triangulatePolygon(poly), engine='trapezoid')
+
+        initial = randomConvexPolygon(100, k=100)
+        self.runLocator(randomConcaveTiling(initial), engine='trapezoid')
+
+        # Axis-aligned squares share x-coordinates and have vertical edges
+        squares = [Polygon([Point(i, j), Point(i + 1, j), Point(i + 1, j + 1),
+                            Point(i, j + 1)]) for i in range(4) for j in range(4)]
+        l = Locator(squares, engine='trapezoid')
+        xy = np.random.uniform(-1, 5, (1000, 2))
+        inside = (xy >= 0).all(axis=1) & (xy < 4).all(axis=1)
+        expected = np.where(inside, 4 * np.floor(xy[:, 0]) + np.floor(xy[:, 1]), -1)
+        self.assertEqual(l.locate_many(xy).tolist(), expected.tolist())
+        self.assertRaises(ValueError, l.save, 'unused')
+
+    def testNearlyCollinear(self):
+        regions = triangulatePolygon(randomConvexPolygon(30))
+        edges = {}
+        for region_id, region in enumerate(regions):
+            for k in range(3):
+                a, b = region.points[k], region.points[(k + 1) % 3]
+                edges.setdefault(frozenset([a, b]), []).append((region_id, a, b))
+
+        # Points within an ulp of the edges shared by two regions
+        for engine in ('kirkpatrick', 'trapezoid'):
+            l = Locator(regions, engine=engine)
+            for (left, a, b), (right, _, _) in [e for e in edges.values() if len(e) == 2]:
+                t = np.random.uniform(0.05, 0.95, 100)
+                xy = np.column_stack((a.x + t * (b.x - a.x), a.y + t * (b.y - a.y)))
+                xy[:, 0] = np.nextafter(xy[:, 0], np.random.choice([-1e9, 1e9], 100))
+                ids = l.locate_many(xy).tolist()
+                for (x, y), region_id in zip(xy.tolist(), ids):
+                    single = l.locate(Point(x, y), as_id=True)
+                    self.assertTrue(region_id in (left, right))
+                    self.assertTrue(single in (left, right))
+                    # Points exactly on the edge may go either way
+                    side = predicates.orientExact(a.x, a.y, b.x, b.y, x, y)
+                    if side:
+                        expected = left if side > 0 else right
+                        self.assertEqual((region_id, single), (expected, expected))
+
+    def testOutline(self):
+        square = lambda x, y: Polygon([Point(x, y), Point(x + 1, y),
+                                       Point(x + 1, y + 1), Point(x, y + 1)])
+        regions = [square(0, 0), square(1, 0), square(0, 1)]
+        corners = [(0, 0), (1, 0), (2, 0), (2, 1), (1, 1), (1, 2), (0, 2), (0, 1)]
+        outline = Polygon([Point(x, y) for x, y in corners])
+        l = Locator(regions, outline=outline)
+        xy = np.array([(0.5, 0.5), (1.75, 0.25), (0.5, 1.5), (1.5, 1.5)])
+        self.assertEqual(l.locate_many(xy).tolist(), [0, 1, 2, -1])
+
+        # Rebuilds keep the outline
+        a, b, c, d = regions[1].points
+        l.replace_regions([1], [Triangle(a, b, c), Triangle(a, c, d)])
+        l.rebuild()
+        self.assertTrue(l.outline is outline)
+        self.assertEqual(l.locate_many(xy).tolist(), [0, 1, 2, -1])
+
     def testConcavePolygons(self):
         initial = randomConvexPolygon(200, k=100)
         convex = set([initial])
@@ -290,6 +928,14 @@ class TestGraph(unittest.TestCase):
             neighbors = g.e[i]
             self.assertEqual(neighbors.intersection(ind_set), set([]))
 
+        ind_set = g.independent_set(6, strategy='min-degree', key=lambda v: v)
+        self.assertEqual(ind_set, g.independent_set(6, strategy='min-degree',
+                                                     key=lambda v: v))
+        for i in ind_set:
+            neighbors = g.e[i]
+            self.assertTrue(len(neighbors) <= 6)
+            self.assertEqual(neighbors.intersection(ind_set), set([]))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,422 @@
+import random
+
+import numpy as np
+
+from geo import predicates, spatial
+
+# Kinds of search structure nodes
+X_NODE = 0
+Y_NODE = 1
+LEAF = 2
+
+
+def orient(a, b, c):
+    """Returns twice the signed area of abc: positive if c lies left of ab."""
+    return (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+
+
+def side_of(a, b, c):
+    """Returns the exact sign of orient(a, b, c) (see geo.predicates)."""
+    return predicates.orient(a[0], a[1], b[0], b[1], c[0], c[1])
+
+
+class Segment(object):
+
+    """
+        A subdivision edge from its lexicographically smaller endpoint to the other,
+        along with the indices of the regions above and below it (-1 for none).
+    """
+
+    __slots__ = ('left', 'right', 'above', 'below')
+
+    def __init__(self, left, right):
+        self.left = left
+        self.right = right
+        self.above = -1
+        self.below = -1
+
+
+class Trapezoid(object):
+
+    __slots__ = ('top', 'bottom', 'leftp', 'rightp', 'upper_left', 'lower_left',
+                 'upper_right', 'lower_right', 'node')
+
+    def __init__(self, top, bottom, leftp, rightp):
+        self.top = top
+        self.bottom = bottom
+        self.leftp = leftp
+        self.rightp = rightp
+        self.upper_left = None
+        self.lower_left = None
+        self.upper_right = None
+        self.lower_right = None
+        self.node = None
+
+
+class Node(object):
+
+    """
+        A node of the search structure. An x-node tests a query against its point
+        (right child if not smaller, lexicographically), a y-node against its
+        segment (left child if above), and a leaf holds a trapezoid.
+    """
+
+    __slots__ = ('kind', 'key', 'left', 'right', 'trapezoid')
+
+    def __init__(self, kind, key=None, left=None, right=None, trapezoid=None):
+        self.kind = kind
+        self.key = key
+        self.left = left
+        self.right = right
+        self.trapezoid = trapezoid
+
+    def become(self, other):
+        self.kind = other.kind
+        self.key = other.key
+        self.left = other.left
+        self.right = other.right
+        self.trapezoid = other.trapezoid
+
+
+def leaf(trapezoid):
+    if trapezoid.node is None:
+        trapezoid.node = Node(LEAF, trapezoid=trapezoid)
+    return trapezoid.node
+
+
+def subdivisionSegments(regions):
+    """
+        Returns the distinct edges of a set of regions as Segments, each knowing
+        the regions on either side of it.
+    """
+    segments = {}
+    for region_id, region in enumerate(regions):
+        points = [(float(p.x), float(p.y)) for p in region.points]
+        n = len(points)
+        area = sum(orient((0.0, 0.0), points[i], points[(i + 1) % n])
+                   for i in range(n))
+
+        for i in range(n):
+            a = points[i]
+            b = points[(i + 1) % n]
+            if a == b:
+                continue
+            # Regions lie to the left of their edges when listed in CCW order
+            if (a < b) == (area > 0):
+                side = 'above'
+            else:
+                side = 'below'
+            key = (min(a, b), max(a, b))
+            if key not in segments:
+                segments[key] = Segment(key[0], key[1])
+            setattr(segments[key], side, region_id)
+
+    return list(segments.values())
+
+
+class TrapezoidalMap(object):
+
+    """
+        A trapezoidal map of the edges of a planar subdivision, built by randomized
+        incremental construction (expected O(n log n) time, O(n) size and O(log n)
+        query). Ties in x are broken lexicographically, as by a symbolic shear.
+
+        Once built, the search structure is flattened into arrays: node kinds, node
+        keys (a point for x-nodes, a segment's endpoints for y-nodes), the two
+        children of each node, and, for leaves, the index of the region containing
+        the trapezoid (or -1). It answers queries through the same interface as
+        hierarchy.Hierarchy.
+    """
+
+    def __init__(self, regions, seed=0):
+        """
+            Arguments:
+            regions -- a set of non-overlapping polygons that tile some part of the plane
+            seed -- the seed of the random insertion order
+        """
+        self.regions = regions
+
+        segments = subdivisionSegments(regions)
+        random.Random(seed).shuffle(segments)
+
+        # Start from a box around every segment
+        xy = np.array([p for s in segments for p in (s.left, s.right)])
+        lo = xy.min(axis=0)
+        hi = xy.max(axis=0)
+        margin = 0.1 * (hi - lo).max() + 1.0
+        self.bbox = (float(lo[0] - margin), float(lo[1] - margin),
+                     float(hi[0] + margin), float(hi[1] + margin))
+        box = Trapezoid(None, None, self.bbox[:2], self.bbox[2:])
+        root = leaf(box)
+
+        for segment in segments:
+            self.insert(root, segment)
+
+        self.compile(root)
+
+    def find(self, root, p, q):
+        """Returns the trapezoid containing p, just right of p along segment pq."""
+        node = root
+        while node.kind != LEAF:
+            if node.kind == X_NODE:
+                node = node.right if p >= node.key else node.left
+            else:
+                segment = node.key
+                side = side_of(segment.left, segment.right, p)
+                if side == 0:
+                    # pq and the segment share their left endpoint
+                    side = side_of(segment.left, segment.right, q)
+                node = node.left if side > 0 else node.right
+        return node.trapezoid
+
+    def insert(self, root, s):
+        """Adds segment s to the map, updating the search structure under root."""
+        p, q = s.left, s.right
+
+        # Find the trapezoids crossed by s, from left to right
+        crossed = [self.find(root, p, q)]
+        while q > crossed[-1].rightp:
+            t = crossed[-1]
+            if side_of(p, q, t.rightp) > 0:
+                crossed.append(t.lower_right)
+            else:
+                crossed.append(t.upper_right)
+
+        # Split each crossed trapezoid in two along s. Pieces on the same side of s
+        # merge across walls whose defining point lies on the other side.
+        upper = Trapezoid(crossed[0].top, s, p, None)
+        lower = Trapezoid(s, crossed[0].bottom, p, None)
+        uppers = []
+        lowers = []
+        for i, t in enumerate(crossed):
+            if i:
+                prev = crossed[i - 1]
+                w = t.leftp
+                if side_of(p, q, w) > 0:
+                    piece = Trapezoid(t.top, s, w, None)
+                    upper.rightp = w
+                    upper.upper_right = prev.upper_right
+                    if prev.upper_right:
+                        prev.upper_right.upper_left = upper
+                    upper.lower_right = piece
+                    piece.lower_left = upper
+                    piece.upper_left = t.upper_left
+                    if t.upper_left:
+                        t.upper_left.upper_right = piece
+                    upper = piece
+                else:
+                    piece = Trapezoid(s, t.bottom, w, None)
+                    lower.rightp = w
+                    lower.lower_right = prev.lower_right
+                    if prev.lower_right:
+                        prev.lower_right.lower_left = lower
+                    lower.upper_right = piece
+                    piece.upper_left = lower
+                    piece.lower_left = t.lower_left
+                    if t.lower_left:
+                        t.lower_left.lower_right = piece
+                    lower = piece
+            uppers.append(upper)
+            lowers.append(lower)
+        upper.rightp = q
+        lower.rightp = q
+
+        # Close off the left end...
+        first = crossed[0]
+        left = None
+        if p != first.leftp:
+            left = Trapezoid(first.top, first.bottom, first.leftp, p)
+            left.upper_left = first.upper_left
+            if first.upper_left:
+                first.upper_left.upper_right = left
+            left.lower_left = first.lower_left
+            if first.lower_left:
+                first.lower_left.lower_right = left
+            left.upper_right = uppers[0]
+            uppers[0].upper_left = left
+            left.lower_right = lowers[0]
+            lowers[0].lower_left = left
+        else:
+            uppers[0].upper_left = first.upper_left
+            if first.upper_left:
+                first.upper_left.upper_right = uppers[0]
+            lowers[0].lower_left = first.lower_left
+            if first.lower_left:
+                first.lower_left.lower_right = lowers[0]
+
+        # ...and the right end
+        last = crossed[-1]
+        right = None
+        if q != last.rightp:
+            right = Trapezoid(last.top, last.bottom, q, last.rightp)
+            right.upper_right = last.upper_right
+            if last.upper_right:
+                last.upper_right.upper_left = right
+            right.lower_right = last.lower_right
+            if last.lower_right:
+                last.lower_right.lower_left = right
+            right.upper_left = uppers[-1]
+            uppers[-1].upper_right = right
+            right.lower_left = lowers[-1]
+            lowers[-1].lower_right = right
+        else:
+            uppers[-1].upper_right = last.upper_right
+            if last.upper_right:
+                last.upper_right.upper_left = uppers[-1]
+            lowers[-1].lower_right = last.lower_right
+            if last.lower_right:
+                last.lower_right.lower_left = lowers[-1]
+
+        # Replace the crossed trapezoids' leaves
+        for i, t in enumerate(crossed):
+            node = Node(Y_NODE, s, leaf(uppers[i]), leaf(lowers[i]))
+            if i == len(crossed) - 1 and right:
+                node = Node(X_NODE, q, node, leaf(right))
+            if i == 0 and left:
+                node = Node(X_NODE, p, leaf(left), node)
+            t.node.become(node)
+
+    def compile(self, root):
+        """Flattens the search structure under root into arrays."""
+        index = {root: 0}
+        order = [root]
+        for node in order:
+            if node.kind != LEAF:
+                for child in (node.left, node.right):
+                    if child not in index:
+                        index[child] = len(order)
+                        order.append(child)
+
+        m = len(order)
+        kinds = np.empty(m, dtype=np.int8)
+        keys = np.zeros((m, 4), dtype=np.float64)
+        first = np.zeros(m, dtype=np.int64)
+        second = np.zeros(m, dtype=np.int64)
+        leaves = np.empty(m, dtype=np.int64)
+        leaves.fill(-1)
+        for i, node in enumerate(order):
+            kinds[i] = node.kind
+            if node.kind == X_NODE:
+                keys[i, :2] = node.key
+            elif node.kind == Y_NODE:
+                keys[i, :2] = node.key.left
+                keys[i, 2:] = node.key.right
+            else:
+                top = node.trapezoid.top
+                if top is not None:
+                    leaves[i] = top.below
+            if node.kind != LEAF:
+                first[i] = index[node.left]
+                second[i] = index[node.right]
+
+        for array in (kinds, keys, first, second, leaves):
+            array.setflags(write=False)
+        self.kinds = kinds
+        self.keys = keys
+        self.first = first
+        self.second = second
+        self.leaves = leaves
+
+        # Plain lists make the pure Python single-point walk faster
+        self._kinds = kinds.tolist()
+        self._keys = keys.tolist()
+        self._first = first.tolist()
+        self._second = second.tolist()
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def depth(self):
+        """Returns the length of the longest path from the root to a leaf."""
+        depth = 0
+        frontier = np.zeros(1, dtype=np.int64)
+        while True:
+            frontier = frontier[self.kinds[frontier] != LEAF]
+            if not len(frontier):
+                return depth
+            frontier = np.unique(np.concatenate((self.first[frontier],
+                                                 self.second[frontier])))
+            depth += 1
+
+    def polygon(self, i):
+        """Trapezoids outside the subdivision are not reported."""
+        return None
+
+    def inside(self, x, y):
+        min_x, min_y, max_x, max_y = self.bbox
+        return min_x <= x <= max_x and min_y <= y <= max_y
+
+    def trace(self, x, y):
+        """
+            Locates (x, y) like locate, also counting the work done.
+
+            Returns: the leaf (or -1), the number of levels descended, and the
+            number of nodes tested
+        """
+        x, y = float(x), float(y)
+        if not self.inside(x, y):
+            return -1, 0, 0
+
+        kinds = self._kinds
+        keys = self._keys
+        i = 0
+        levels = 0
+        while kinds[i] != LEAF:
+            levels += 1
+            ax, ay, bx, by = keys[i]
+            if kinds[i] == X_NODE:
+                go_first = x < ax or (x == ax and y < ay)
+            else:
+                go_first = predicates.orient(ax, ay, bx, by, x, y) >= 0
+            i = self._first[i] if go_first else self._second[i]
+        return i, levels, levels
+
+    def locate(self, x, y):
+        """Returns the leaf containing (x, y), or -1 if there is none."""
+        return self.trace(x, y)[0]
+
+    def locate_many(self, xy, trace=False):
+        """
+            Locates an (N, 2) array of points, descending one level at a time for
+            all of them together.
+
+            Returns: an (N,) array of the leaf containing each point (or -1); if
+            trace, also (N,) arrays of the levels descended and nodes tested for
+            each point
+        """
+        xy = spatial.toArray(xy)
+        n = len(xy)
+        leaf = np.empty(n, dtype=np.int64)
+        leaf.fill(-1)
+        levels = np.zeros(n, dtype=np.int64)
+
+        min_x, min_y, max_x, max_y = self.bbox
+        x = xy[:, 0]
+        y = xy[:, 1]
+        active = np.flatnonzero((x >= min_x) & (x <= max_x)
+                                & (y >= min_y) & (y <= max_y))
+        node = np.zeros(len(active), dtype=np.int64)
+        while len(active):
+            kind = self.kinds[node]
+            done = kind == LEAF
+            leaf[active[done]] = node[done]
+            keep = ~done
+            active, node, kind = active[keep], node[keep], kind[keep]
+            levels[active] += 1
+
+            x = xy[active, 0]
+            y = xy[active, 1]
+            ax, ay, bx, by = [self.keys[node, i] for i in range(4)]
+            go_first = (x < ax) | ((x == ax) & (y < ay))
+            k = np.flatnonzero(kind == Y_NODE)
+            go_first[k] = predicates.orientMany(ax[k], ay[k], bx[k], by[k],
+                                                x[k], y[k]) >= 0
+            node = np.where(go_first, self.first[node], self.second[node])
+
+        if trace:
+            return leaf, levels, levels.copy()
+        return leaf
+
+    def regions_of(self, leaf):
+        """Maps an array of leaves (as returned by locate_many) to region indices."""
+        return np.where(leaf >= 0, self.leaves[leaf], -1)